@@ -94,8 +94,10 @@ class AuditLogger:
         if self._last_line is not None:
             prev_hash = hashlib.sha256(self._last_line.encode()).hexdigest()
 
-        # Serialize event and inject prev_hash
-        data = json.loads(event.model_dump_json())
+        # Serialize event and inject prev_hash. model_dump(mode="json") yields
+        # JSON-ready values directly, without a dump_json/loads round trip;
+        # stdlib json keeps lines ASCII-escaped, so existing chains stay stable.
+        data = event.model_dump(mode="json")
         data["prev_hash"] = prev_hash
         line = json.dumps(data, separators=(",", ":"))
 
@@ -6,7 +6,7 @@ import contextlib
 import json
 import logging
 import os
-from collections.abc import AsyncIterator
+from collections.abc import AsyncIterator, Awaitable, Callable
 from typing import TYPE_CHECKING
 
 import httpx
@@ -48,6 +48,7 @@ def create_app_from_env() -> FastAPI:
     )
     audit_log = os.environ.get("AUDIT_LOG_PATH")
     sanitizer = PromptSanitizer(prompt_rules)
+    sanitizer.blocking = os.environ.get("PROMPT_SANITIZER_BLOCKING", "false").lower() == "true"
     response_scanner: PromptSanitizer | None = None
     if os.path.exists(indirect_rules):
         response_scanner = PromptSanitizer(indirect_rules)
@@ -62,6 +63,7 @@ def create_app_from_env() -> FastAPI:
     replay_db_path = os.environ.get("REPLAY_DB_PATH", "data/replay.db")
     webhook_rate_limit = int(os.environ.get("WEBHOOK_RATE_LIMIT", "60"))
     whatsapp_replay_window = int(os.environ.get("WHATSAPP_REPLAY_WINDOW_SECONDS", "300"))
+    history_path = os.environ.get("CONVERSATION_HISTORY_PATH") or None
 
     return create_app(
         upstream_url,
@@ -76,6 +78,7 @@ def create_app_from_env() -> FastAPI:
         replay_db_path=replay_db_path,
         webhook_rate_limit=webhook_rate_limit,
         whatsapp_replay_window=whatsapp_replay_window,
+        history_path=history_path,
     )
 
 
@@ -167,9 +170,21 @@ def create_app(
     replay_db_path: str = "data/replay.db",
     webhook_rate_limit: int = 60,
     whatsapp_replay_window: int = 300,
+    history_path: str | None = None,
 ) -> FastAPI:
     """Create the proxy FastAPI app with auth, governance, and sanitization."""
-    app = FastAPI(docs_url=None, redoc_url=None)
+    # Shared HTTP clients opened by the webhook relays are closed on shutdown.
+    shutdown_hooks: list[Callable[[], Awaitable[None]]] = []
+
+    @contextlib.asynccontextmanager
+    async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+        try:
+            yield
+        finally:
+            for close in shutdown_hooks:
+                await close()
+
+    app = FastAPI(docs_url=None, redoc_url=None, lifespan=lifespan)
 
     # Register governance API routes if governance is enabled
     if governance is not None:
@@ -193,6 +208,8 @@ def create_app(
         replay_db_path=replay_db_path,
         webhook_rate_limit=webhook_rate_limit,
         whatsapp_replay_window=whatsapp_replay_window,
+        history_path=history_path,
+        shutdown_hooks=shutdown_hooks,
     )
 
     @app.get("/health")
@@ -322,10 +339,15 @@ def _register_webhook_routes(
     replay_db_path: str,
     webhook_rate_limit: int,
     whatsapp_replay_window: int,
+    history_path: str | None,
+    shutdown_hooks: list[Callable[[], Awaitable[None]]],
 ) -> set[str]:
     """Register webhook routes only when corresponding tokens are configured (NFR-2).
 
-    Returns the set of registered webhook paths that should bypass Bearer auth.
+    Close callbacks for the relays' shared HTTP clients (and a flush of the
+    persisted conversation history, when history_path is set) are added to
+    shutdown_hooks. Returns the set of registered webhook paths that should
+    bypass Bearer auth.
     """
     registered_paths: set[str] = set()
     if not telegram_bot_token and not whatsapp_config:
@@ -341,6 +363,12 @@ def _register_webhook_routes(
         db_path=replay_db_path,
         whatsapp_window_seconds=whatsapp_replay_window,
     )
+    conversation_history = ConversationHistory(persistence_path=history_path)
+    if history_path is not None:
+        async def _flush_history() -> None:
+            conversation_history.flush()
+
+        shutdown_hooks.append(_flush_history)
     pipeline = WebhookRelayPipeline(
         sanitizer=sanitizer,
         upstream_url=upstream_url,
@@ -349,13 +377,15 @@ def _register_webhook_routes(
         governance=governance,
         response_scanner=response_scanner,
         audit_logger=audit_logger,
-        conversation_history=ConversationHistory(),
+        conversation_history=conversation_history,
     )
+    shutdown_hooks.append(pipeline.aclose)
 
     if telegram_bot_token:
         from src.webhook.telegram import TelegramRelay
 
         tg_relay = TelegramRelay(bot_token=telegram_bot_token)
+        shutdown_hooks.append(tg_relay.aclose)
 
         registered_paths.add("/webhook/telegram")
 
@@ -27,6 +27,11 @@ class PromptInjectionError(Exception):
 class PromptSanitizer:
     """Configurable prompt injection detection and neutralization."""
 
+    # Set to True (per instance or subclass) when the rule set is expensive
+    # enough that callers on an event loop should run sanitize() in a worker
+    # thread. The default rule sets are a handful of regexes and run inline.
+    blocking: bool = False
+
     def __init__(self, rules_path: str, audit_logger: AuditLogger | None = None) -> None:
         self.audit_logger = audit_logger
         self._rules: list[SanitizationRule] = []
@@ -1,83 +1,334 @@
 """Per-session conversation history store for webhook relay.
 
 Maintains multi-turn message history keyed by session_id, enabling
-stateful conversations through a stateless upstream API.
+stateful conversations through a stateless upstream API. History can
+optionally be persisted to a JSONL append-only log that is replayed on
+startup and compacted whenever it outgrows the live history.
 """
 
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import itertools
 import logging
+import os
 import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import orjson
 
 logger = logging.getLogger(__name__)
 
 _DEFAULT_MAX_TURNS = 20  # user+assistant pairs
 _DEFAULT_SESSION_TTL_SECONDS = 24 * 3600  # 24 hours
+_DEFAULT_MAX_SESSIONS = 1000
+_DEFAULT_FLUSH_EVERY = 5  # buffered log records per write
+# The log is rewritten once it holds this many times the live message
+# count (as of the last rewrite), and never below _COMPACT_MIN_RECORDS.
+_COMPACT_RATIO = 2
+_COMPACT_MIN_RECORDS = 1000
+
+# Sessions are keyed by (source, sender_id); plain string ids are also accepted.
+SessionKey = tuple[str, str] | str
+
+
+@dataclass(slots=True)
+class _Session:
+    """Stored state for one conversation session."""
+
+    # Bounded, so appending past the limit drops the oldest message.
+    messages: deque[tuple[str, str]]
+    last_activity_ns: int
+
+
+@dataclass(slots=True)
+class _SessionLock:
+    """Lock serializing one session's relays, with its holder/waiter count."""
+
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    users: int = 0
 
 
 class ConversationHistory:
     """In-memory conversation history store keyed by session_id.
 
-    Each entry is an OpenAI-compatible messages list:
+    Messages are stored as compact (role, content) tuples; get() returns
+    them in the OpenAI-compatible messages shape:
         [{"role": "user"|"assistant", "content": str}, ...]
 
     Oldest messages are dropped when the history exceeds max_turns pairs.
     Sessions with no activity for longer than session_ttl_seconds are evicted
-    to prevent unbounded memory growth from sender churn.
+    to prevent unbounded memory growth from sender churn, and at most
+    max_sessions sessions are kept regardless of traffic shape. Sessions are
+    kept in least-recently-active order, so eviction only inspects the oldest
+    entries instead of scanning every session. A session with a relay holding
+    or waiting on its lock() is never evicted, so the cap can be exceeded by
+    the number of sessions in flight until they finish.
+
+    With persistence_path set, every append and session removal is recorded
+    as one JSONL line. Lines are buffered and written every flush_every
+    records (and on flush()) without fsync, so a crash loses at most the
+    unflushed tail. On construction an existing log is replayed, then
+    rewritten atomically with only the live sessions; the same rewrite runs
+    whenever the log grows past _COMPACT_RATIO times the live message count,
+    so cleared and evicted conversations do not linger on disk. A failed
+    write is logged and retried on a later flush instead of failing the
+    caller.
     """
 
     def __init__(
         self,
         max_turns: int = _DEFAULT_MAX_TURNS,
         session_ttl_seconds: float = _DEFAULT_SESSION_TTL_SECONDS,
+        max_sessions: int = _DEFAULT_MAX_SESSIONS,
+        persistence_path: str | Path | None = None,
+        flush_every: int = _DEFAULT_FLUSH_EVERY,
     ) -> None:
+        if max_turns < 1:
+            # deque(maxlen=0) would silently discard every message, including
+            # the user turn the relay expects to read back.
+            raise ValueError(f"max_turns must be at least 1, got {max_turns}")
+        if max_sessions < 1:
+            # With no room for even the current session, the user turn would
+            # be evicted as soon as it was appended.
+            raise ValueError(f"max_sessions must be at least 1, got {max_sessions}")
         self._max_messages = max_turns * 2  # each turn = user + assistant
-        self._session_ttl = session_ttl_seconds
-        self._store: dict[str, list[dict[str, str]]] = {}
-        self._last_seen: dict[str, float] = {}
+        self._max_sessions = max_sessions
+        # Timestamps are integer nanoseconds from time.monotonic_ns().
+        self._session_ttl_ns = int(session_ttl_seconds * 1_000_000_000)
+        # session_id -> session, least recently active first.
+        self._sessions: OrderedDict[SessionKey, _Session] = OrderedDict()
+        # Locks for sessions in use, kept apart from _sessions so eviction
+        # never swaps a held lock for a fresh one; dropped when unused.
+        self._locks: dict[SessionKey, _SessionLock] = {}
+        self._flush_every = flush_every
+        self._pending: list[bytes] = []
+        # Records in the log file, and the count that triggers a rewrite.
+        self._log_records = 0
+        self._compact_at = _COMPACT_MIN_RECORDS
+        # Set when an append failed, since the log may end in a torn record.
+        self._torn_tail = False
+        # Recording stays off (no path) while an existing log is replayed.
+        self._path: Path | None = None
+        if persistence_path is not None:
+            path = Path(persistence_path)
+            self._load(path)
+            self._compact(path)
+            self._path = path
 
-    def get(self, session_id: str) -> list[dict[str, str]]:
+    def get(self, session_id: SessionKey) -> list[dict[str, str]]:
         """Return a copy of the history for the given session."""
-        return list(self._store.get(session_id, []))
-
-    def append_user(self, session_id: str, content: str) -> None:
-        """Append a user message, evict stale sessions, and truncate if over the limit."""
-        self._evict_stale_sessions()
-        history = self._store.setdefault(session_id, [])
-        history.append({"role": "user", "content": content})
-        self._last_seen[session_id] = time.monotonic()
-        self._truncate(session_id)
-
-    def append_assistant(self, session_id: str, content: str) -> None:
-        """Append an assistant message and truncate if over the limit."""
-        history = self._store.setdefault(session_id, [])
-        history.append({"role": "assistant", "content": content})
-        self._last_seen[session_id] = time.monotonic()
-        self._truncate(session_id)
-
-    def clear(self, session_id: str) -> None:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return []
+        return [{"role": role, "content": content} for role, content in session.messages]
+
+    def view(self, session_id: SessionKey) -> Sequence[tuple[str, str]]:
+        """Return the stored (role, content) pairs for a session without copying.
+
+        The result is live and must be treated as read-only; callers that
+        keep it across an append should use get() instead.
+        """
+        session = self._sessions.get(session_id)
+        return session.messages if session is not None else ()
+
+    @contextlib.asynccontextmanager
+    async def lock(self, session_id: SessionKey) -> AsyncIterator[None]:
+        """Hold the lock guarding one session for the duration of the block.
+
+        Store operations are plain dict/deque calls on the event loop and
+        take no lock; this one lets a caller keep its user append, upstream
+        call and assistant append for a session in order, without blocking
+        other sessions. While the lock is held or awaited the session is
+        exempt from eviction.
+        """
+        entry = self._locks.get(session_id)
+        if entry is None:
+            entry = self._locks[session_id] = _SessionLock()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            if not entry.users:
+                del self._locks[session_id]
+
+    def append_user(self, session_id: SessionKey, content: str) -> None:
+        """Append a user message after evicting stale sessions.
+
+        If the new message opens a session beyond max_sessions, the least
+        recently active session is dropped.
+        """
+        now_ns = time.monotonic_ns()  # one clock read covers eviction and the stamp
+        self._evict_stale_sessions(now_ns)
+        self._append(session_id, "user", content, now_ns)
+        self._evict_over_cap()
+
+    def append_assistant(self, session_id: SessionKey, content: str) -> None:
+        """Append an assistant message to an existing session.
+
+        A reply for a session that no longer exists (e.g. cleared while the
+        upstream call was in flight) is dropped rather than reopening the
+        session with an orphan assistant turn.
+        """
+        if session_id not in self._sessions:
+            logger.debug("Dropping reply for missing conversation session: %s", session_id)
+            return
+        self._append(session_id, "assistant", content, time.monotonic_ns())
+
+    def clear(self, session_id: SessionKey) -> None:
         """Remove all history for the given session."""
-        self._store.pop(session_id, None)
-        self._last_seen.pop(session_id, None)
-
-    def _truncate(self, session_id: str) -> None:
-        history = self._store[session_id]
-        if len(history) > self._max_messages:
-            dropped = len(history) - self._max_messages
-            self._store[session_id] = history[-self._max_messages :]
-            logger.debug(
-                "Truncated conversation history for %s: dropped %d oldest messages",
-                session_id,
-                dropped,
-            )
-
-    def _evict_stale_sessions(self) -> None:
-        now = time.monotonic()
-        stale = [
-            sid for sid, ts in self._last_seen.items()
-            if now - ts > self._session_ttl
-        ]
+        if self._sessions.pop(session_id, None) is not None:
+            self._record({"op": "drop", "key": session_id})
+
+    def flush(self) -> None:
+        """Write buffered log records to the persistence file, if any.
+
+        Once the log would outgrow the compaction threshold it is rewritten
+        from memory instead of appended to. An OSError (e.g. a full disk) is
+        logged rather than raised, and the records stay buffered for the
+        next flush.
+        """
+        if not self._pending or self._path is None:
+            return
+        try:
+            if self._log_records + len(self._pending) >= self._compact_at:
+                self._compact(self._path)
+            else:
+                self._append_records(self._path)
+        except OSError as exc:
+            logger.warning("Failed to write conversation history to %s: %s", self._path, exc)
+            return
+        self._pending.clear()
+
+    def _append_records(self, path: Path) -> None:
+        """Append the buffered records to the log."""
+        data = b"".join(self._pending)
+        if self._torn_tail:
+            # A failed append may have left a partial record; end it on its
+            # own line so replay skips it instead of merging it with the next.
+            data = b"\n" + data
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            with os.fdopen(fd, "ab") as f:
+                f.write(data)
+        except OSError:
+            self._torn_tail = True
+            raise
+        self._torn_tail = False
+        self._log_records += len(self._pending)
+
+    def _get_or_create(self, session_id: SessionKey, now_ns: int) -> _Session:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = _Session(deque(maxlen=self._max_messages), now_ns)
+            self._sessions[session_id] = session
+        return session
+
+    def _append(self, session_id: SessionKey, role: str, content: str, now_ns: int) -> None:
+        session = self._get_or_create(session_id, now_ns)
+        session.last_activity_ns = now_ns
+        self._sessions.move_to_end(session_id)
+        session.messages.append((role, content))
+        if self._path is not None:
+            self._record({
+                "op": "append", "key": session_id, "role": role,
+                "content": content, "ts": time.time(),
+            })
+
+    def _evict_stale_sessions(self, now_ns: int) -> None:
+        stale: list[SessionKey] = []
+        for sid, session in self._sessions.items():
+            if now_ns - session.last_activity_ns <= self._session_ttl_ns:
+                break
+            if sid not in self._locks:
+                stale.append(sid)
         for sid in stale:
-            self._store.pop(sid, None)
-            self._last_seen.pop(sid, None)
+            del self._sessions[sid]
+            self._record({"op": "drop", "key": sid})
             logger.debug("Evicted stale conversation session: %s", sid)
+
+    def _evict_over_cap(self) -> None:
+        excess = len(self._sessions) - self._max_sessions
+        if excess <= 0:
+            return
+        idle = (sid for sid in self._sessions if sid not in self._locks)
+        for sid in list(itertools.islice(idle, excess)):
+            del self._sessions[sid]
+            self._record({"op": "drop", "key": sid})
+            logger.debug("Evicted least recently active conversation session: %s", sid)
+
+    def _record(self, entry: dict[str, Any]) -> None:
+        if self._path is None:
+            return
+        self._pending.append(orjson.dumps(entry) + b"\n")
+        if len(self._pending) >= self._flush_every:
+            self.flush()
+
+    def _load(self, path: Path) -> None:
+        """Replay an existing persistence log into memory."""
+        if not path.exists():
+            return
+        # Wall-clock record times are mapped onto the monotonic clock so the
+        # TTL keeps counting across restarts.
+        now_ns, wall_now = time.monotonic_ns(), time.time()
+        with open(path, "rb") as f:
+            for lineno, line in enumerate(f, 1):
+                if line.isspace():
+                    continue  # left by a retried append; see _append_records()
+                try:
+                    entry = orjson.loads(line)
+                    key = entry["key"]
+                    if isinstance(key, list):
+                        key = (key[0], key[1])
+                    if entry["op"] == "append":
+                        age_ns = int((wall_now - entry["ts"]) * 1_000_000_000)
+                        seen_ns = now_ns - max(age_ns, 0)
+                        session = self._get_or_create(key, seen_ns)
+                        session.last_activity_ns = seen_ns
+                        self._sessions.move_to_end(key)
+                        session.messages.append((entry["role"], entry["content"]))
+                    else:
+                        self._sessions.pop(key, None)
+                except (orjson.JSONDecodeError, KeyError, IndexError, TypeError):
+                    # A crash mid-write can leave a truncated final line.
+                    logger.warning(
+                        "Skipping malformed conversation history record at %s:%d",
+                        path, lineno,
+                    )
+        self._evict_stale_sessions(now_ns)
+        self._evict_over_cap()
+
+    def _compact(self, path: Path) -> None:
+        """Atomically rewrite the log with one record per live message."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.tmp")
+        wall_now, now_ns = time.time(), time.monotonic_ns()
+        records = 0
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                for key, session in self._sessions.items():
+                    ts = wall_now - (now_ns - session.last_activity_ns) / 1_000_000_000
+                    for role, content in session.messages:
+                        f.write(orjson.dumps({
+                            "op": "append", "key": key, "role": role,
+                            "content": content, "ts": ts,
+                        }) + b"\n")
+                    records += len(session.messages)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except OSError:
+            with contextlib.suppress(OSError):
+                tmp.unlink(missing_ok=True)
+            raise
+        self._torn_tail = False
+        self._log_records = records
+        self._compact_at = max(_COMPACT_RATIO * records, _COMPACT_MIN_RECORDS)
@@ -6,6 +6,8 @@ from dataclasses import dataclass, field
 from enum import Enum
 from typing import Any
 
+import pybase64
+
 
 class AttachmentType(str, Enum):
     """Types of file attachments that can arrive via Telegram."""
@@ -18,19 +20,35 @@ class AttachmentType(str, Enum):
     STICKER = "sticker"
 
 
-@dataclass
+@dataclass(slots=True)
 class Attachment:
-    """A downloaded file attachment from a Telegram message."""
+    """A downloaded file attachment from a Telegram message.
+
+    ``data`` may be a read-only memoryview over the download buffer so the
+    payload is never copied on its way to the encoder. ``file_size`` is
+    informational; size limits are measured from ``data`` itself.
+    """
 
     type: AttachmentType
     file_id: str
     mime_type: str
     file_name: str
     file_size: int
-    data: bytes
+    data: bytes | memoryview
+    _b64: str | None = field(default=None, init=False, repr=False, compare=False)
+
+    def b64(self) -> str:
+        """Return ``data`` base64-encoded, computing it at most once.
+
+        pybase64 uses a SIMD encoder where the CPU supports one and returns
+        the str directly, skipping the intermediate bytes object.
+        """
+        if self._b64 is None:
+            self._b64 = pybase64.b64encode_as_string(self.data)
+        return self._b64
 
 
-@dataclass
+@dataclass(slots=True)
 class WebhookMessage:
     """Normalized inbound webhook message for pipeline processing."""
 
@@ -41,7 +59,7 @@ class WebhookMessage:
     attachments: list[Attachment] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class WebhookResponse:
     """Pipeline response to return to the originating platform."""
 
@@ -14,18 +14,23 @@ Pipeline stages:
 
 from __future__ import annotations
 
-import base64
-import json
+import asyncio
 import logging
+from collections import OrderedDict
+from functools import partial
 from typing import TYPE_CHECKING, Any
 
 import httpx
+import orjson
 
+from src.governance.models import GovernanceDecision
 from src.models import AuditEvent, AuditEventType, RiskLevel
 from src.sanitizer.sanitizer import PromptInjectionError
 from src.webhook.models import Attachment, AttachmentType, WebhookMessage, WebhookResponse
 
 if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable
+
     from src.audit.logger import AuditLogger
     from src.governance.middleware import GovernanceMiddleware
     from src.quarantine.manager import QuarantineManager
@@ -35,7 +40,64 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 _MAX_BODY_SIZE = 10 * 1024 * 1024  # 10MB (NFR-7)
-
+# Attachment bytes above which base64 encoding moves off the event loop.
+_THREAD_ENCODE_MIN_BYTES = 256 * 1024
+_FILENAME_CACHE_SIZE = 1024
+_CLIENT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+
+def _image_block(attachment: Attachment, encoded: str) -> dict[str, Any]:
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:{attachment.mime_type};base64,{encoded}",
+        },
+    }
+
+
+def _audio_block(attachment: Attachment, encoded: str) -> dict[str, Any]:
+    # Derive format from mime_type (e.g. "audio/ogg" → "ogg")
+    fmt = attachment.mime_type.split("/")[-1].split(";")[0]
+    return {
+        "type": "input_audio",
+        "input_audio": {
+            "data": encoded,
+            "format": fmt,
+        },
+    }
+
+
+def _file_block(attachment: Attachment, encoded: str) -> dict[str, Any]:
+    return {
+        "type": "file",
+        "file": {
+            "filename": attachment.file_name,
+            "content_type": attachment.mime_type,
+            "data": encoded,
+        },
+    }
+
+
+# Wire label per attachment type, read once instead of via Enum.value per use.
+_TYPE_LABEL: dict[AttachmentType, str] = {t: t.value for t in AttachmentType}
+
+_BUILDERS: dict[AttachmentType, Callable[[Attachment, str], dict[str, Any]]] = {
+    AttachmentType.IMAGE: _image_block,
+    AttachmentType.STICKER: _image_block,
+    AttachmentType.AUDIO: _audio_block,
+    AttachmentType.VOICE: _audio_block,
+    AttachmentType.DOCUMENT: _file_block,
+    AttachmentType.VIDEO: _file_block,
+}
+
+
+def _request_body(message: WebhookMessage, messages: list[dict[str, Any]]) -> dict[str, Any]:
+    """Build the upstream chat completions request for a relayed message."""
+    return {
+        "model": "default",
+        "messages": messages,
+        "metadata": {"source": message.source, **message.metadata},
+    }
 
 
 def _build_content_parts(
@@ -47,7 +109,7 @@ def _build_content_parts(
     - No attachments → returns plain str (backward compatible, unchanged behavior).
     - With attachments → returns OpenAI multimodal content array.
 
-    Content block format by attachment type:
+    Content block format by attachment type (see ``_BUILDERS``):
     - IMAGE/STICKER: image_url block with data URI
     - AUDIO/VOICE: input_audio block with base64 + format
     - DOCUMENT/VIDEO: file block with base64 content
@@ -55,42 +117,8 @@ def _build_content_parts(
     if not attachments:
         return text
 
-    parts: list[dict[str, Any]] = []
-
-    if text:
-        parts.append({"type": "text", "text": text})
-
-    for attachment in attachments:
-        encoded = base64.b64encode(attachment.data).decode()
-
-        if attachment.type in (AttachmentType.IMAGE, AttachmentType.STICKER):
-            parts.append({
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:{attachment.mime_type};base64,{encoded}",
-                },
-            })
-        elif attachment.type in (AttachmentType.AUDIO, AttachmentType.VOICE):
-            # Derive format from mime_type (e.g. "audio/ogg" → "ogg")
-            fmt = attachment.mime_type.split("/")[-1].split(";")[0]
-            parts.append({
-                "type": "input_audio",
-                "input_audio": {
-                    "data": encoded,
-                    "format": fmt,
-                },
-            })
-        else:
-            # DOCUMENT, VIDEO → generic file block
-            parts.append({
-                "type": "file",
-                "file": {
-                    "filename": attachment.file_name,
-                    "content_type": attachment.mime_type,
-                    "data": encoded,
-                },
-            })
-
+    parts: list[dict[str, Any]] = [{"type": "text", "text": text}] if text else []
+    parts.extend([_BUILDERS[a.type](a, a.b64()) for a in attachments])
     return parts
 
 
@@ -111,15 +139,50 @@ class WebhookRelayPipeline:
         response_scanner: PromptSanitizer | None = None,
         audit_logger: AuditLogger | None = None,
         conversation_history: ConversationHistory | None = None,
+        forward_fn: Callable[[dict[str, Any]], Awaitable[WebhookResponse]] | None = None,
     ) -> None:
         self._sanitizer = sanitizer
+        # Only sanitizers that declare themselves blocking are moved off the loop.
+        self._sanitize_in_thread = sanitizer.blocking
         self._quarantine = quarantine_manager
         self._governance = governance
-        self._upstream_url = upstream_url
-        self._upstream_token = upstream_token
+        # Upstream endpoint and auth headers are fixed for the pipeline's lifetime.
+        self._upstream_post_url = f"{upstream_url.rstrip('/')}/v1/chat/completions"
+        self._upstream_headers = {
+            "Authorization": f"Bearer {upstream_token}",
+            "Content-Type": "application/json",
+        }
         self._response_scanner = response_scanner
         self._audit = audit_logger
-        self._history = conversation_history
+        # Pick the Stage 4 path once; stateless pipelines never touch history.
+        self._exchange: Callable[[WebhookMessage, str], Awaitable[WebhookResponse]] = (
+            self._exchange_stateless
+            if conversation_history is None
+            else partial(self._exchange_with_history, conversation_history)
+        )
+        self._client: httpx.AsyncClient | None = None
+        # Upstream call for Stage 4; forward_fn replaces the httpx POST, e.g. in tests.
+        self._forward: Callable[[dict[str, Any]], Awaitable[WebhookResponse]] = (
+            forward_fn if forward_fn is not None else self._forward_to_upstream
+        )
+        # Filenames that sanitized cleanly, least recently used first.
+        self._filename_cache: OrderedDict[str, str] = OrderedDict()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared upstream client, creating it on first use.
+
+        Reusing one client keeps upstream connections alive across relays
+        instead of paying a TCP (and TLS) handshake per webhook.
+        """
+        if self._client is None:
+            self._client = httpx.AsyncClient(limits=_CLIENT_LIMITS)
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the shared upstream client, if one was opened."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     async def relay(self, message: WebhookMessage) -> WebhookResponse:
         """Run the full relay pipeline for a webhook message."""
@@ -127,9 +190,19 @@ class WebhookRelayPipeline:
         # Stage 1: Body size check (NFR-7)
         # Attachment data is base64-encoded before forwarding, expanding it by ~33%.
         # Use the encoded size (ceil(n/3)*4) so the limit reflects what is actually sent.
-        text_bytes = len(message.text.encode())
-        attachment_bytes = sum((len(a.data) + 2) // 3 * 4 for a in message.attachments)
-        if text_bytes + attachment_bytes > _MAX_BODY_SIZE:
+        # UTF-8 never takes fewer bytes than characters, so text already over
+        # the cap in characters is rejected without scanning or encoding it,
+        # and ASCII text is sized without encoding. The running total stops at
+        # the first attachment that pushes it past the cap.
+        text = message.text
+        total = len(text)
+        if total <= _MAX_BODY_SIZE and not text.isascii():
+            total = len(text.encode())
+        for a in message.attachments:
+            total += (len(a.data) + 2) // 3 * 4
+            if total > _MAX_BODY_SIZE:
+                break
+        if total > _MAX_BODY_SIZE:
             return WebhookResponse(
                 text="Request body too large",
                 status_code=413,
@@ -139,7 +212,10 @@ class WebhookRelayPipeline:
         # Binary attachment content intentionally bypasses the text sanitizer;
         # the response scanner (Stage 5) still catches indirect injection in output.
         try:
-            result = self._sanitizer.sanitize(message.text)
+            if self._sanitize_in_thread:
+                result = await asyncio.to_thread(self._sanitizer.sanitize, message.text)
+            else:
+                result = self._sanitizer.sanitize(message.text)
             clean_text = result.clean
         except PromptInjectionError:
             return WebhookResponse(
@@ -149,11 +225,9 @@ class WebhookRelayPipeline:
 
         # Stage 2.5: Governance evaluation (text + attachment metadata, not binary)
         if self._governance:
-            from src.governance.models import GovernanceDecision
-
             attachment_meta = [
                 {
-                    "type": a.type.value,
+                    "type": _TYPE_LABEL[a.type],
                     "mime_type": a.mime_type,
                     "file_name": a.file_name,
                     "file_size": a.file_size,
@@ -172,24 +246,26 @@ class WebhookRelayPipeline:
             gov_result = self._governance.evaluate(
                 gov_body, None, message.sender_id,
             )
+            decision = gov_result.decision
             if self._audit:
+                decision_label = decision.value
                 self._audit.log(AuditEvent(
                     event_type=AuditEventType.WEBHOOK_RELAY,
                     action="governance_eval",
-                    result=gov_result.decision.value,
+                    result=decision_label,
                     risk_level=RiskLevel.INFO,
                     details={
                         "source": message.source,
                         "sender_id": message.sender_id,
-                        "decision": gov_result.decision.value,
+                        "decision": decision_label,
                     },
                 ))
-            if gov_result.decision == GovernanceDecision.BLOCK:
+            if decision == GovernanceDecision.BLOCK:
                 return WebhookResponse(
                     text="Blocked by governance policy",
                     status_code=403,
                 )
-            if gov_result.decision == GovernanceDecision.REQUIRE_APPROVAL:
+            if decision == GovernanceDecision.REQUIRE_APPROVAL:
                 return WebhookResponse(
                     text=f"Approval required (ID: {gov_result.approval_id})",
                     status_code=202,
@@ -204,51 +280,14 @@ class WebhookRelayPipeline:
                     status_code=403,
                 )
 
-        # Stage 4: Build messages with conversation history and forward to upstream
-        # Session key is namespaced by source to prevent cross-channel ID collisions
-        # (e.g. Telegram chat_id "123" vs WhatsApp phone "123").
-        session_id = f"{message.source}:{message.sender_id}"
-
-        # History stores lightweight text summaries (not base64 blobs) for
-        # each attachment to prevent context growth across multi-turn sessions.
-        # Filenames come from the Telegram payload and are user-controlled, so
-        # each one must be sanitized before being appended to history_text.
-        # On injection detection the filename is replaced with its safe type label.
-        history_text = clean_text
-        if message.attachments:
-            safe_summaries: list[str] = []
-            for a in message.attachments:
-                try:
-                    safe_name = self._sanitizer.sanitize(a.file_name).clean
-                except PromptInjectionError:
-                    safe_name = a.type.value  # fall back to enum label only
-                safe_summaries.append(f"[{a.type.value}: {safe_name}]")
-            summaries = " ".join(safe_summaries)
-            history_text = f"{clean_text} {summaries}".strip()
-
-        if self._history:
-            self._history.append_user(session_id, history_text)
-            history_messages: list[dict[str, Any]] = self._history.get(session_id)
-        else:
-            history_messages = [{"role": "user", "content": history_text}]
-
-        # For the current (last) message, swap in the full multimodal content.
-        # All prior history entries remain as text summaries.
-        current_content = _build_content_parts(clean_text, message.attachments)
-        messages: list[dict[str, Any]] = history_messages[:-1] + [
-            {"role": "user", "content": current_content},
-        ]
-
-        request_body = {
-            "model": "default",
-            "messages": messages,
-            "metadata": {"source": message.source, **message.metadata},
-        }
-        upstream_response = await self._forward_to_upstream(request_body)
-
-        # Update history with assistant reply (only on success)
-        if self._history and upstream_response.status_code == 200:
-            self._history.append_assistant(session_id, upstream_response.text)
+        # Stage 4: Build messages (with conversation history, if configured)
+        # and forward to upstream. Large attachments are encoded in worker
+        # threads first (pybase64 releases the GIL), so other webhooks keep
+        # being served; _build_content_parts then reads the cached result.
+        attachments = message.attachments
+        if sum(len(a.data) for a in attachments) >= _THREAD_ENCODE_MIN_BYTES:
+            await asyncio.gather(*(asyncio.to_thread(a.b64) for a in attachments))
+        upstream_response = await self._exchange(message, clean_text)
 
         # Stage 5: Response scan (indirect injection)
         if self._response_scanner and upstream_response.status_code == 200:
@@ -282,35 +321,119 @@ class WebhookRelayPipeline:
 
         return upstream_response
 
+    async def _exchange_stateless(
+        self, message: WebhookMessage, clean_text: str,
+    ) -> WebhookResponse:
+        """Forward a single-message request; used when no history is configured."""
+        # No history summary is built here, but filenames are user-controlled
+        # and still go through the sanitizer so injection attempts are audited.
+        for a in message.attachments:
+            self._sanitize_filename(a.file_name)
+        current = {"role": "user", "content": _build_content_parts(clean_text, message.attachments)}
+        return await self._forward(_request_body(message, [current]))
+
+    async def _exchange_with_history(
+        self, history: ConversationHistory, message: WebhookMessage, clean_text: str,
+    ) -> WebhookResponse:
+        """Forward the message with prior turns and record the exchange."""
+        # Session key is namespaced by source to prevent cross-channel ID collisions
+        # (e.g. Telegram chat_id "123" vs WhatsApp phone "123"). A tuple key
+        # hashes its parts directly instead of building and hashing a new str.
+        session_id = (message.source, message.sender_id)
+
+        # History stores lightweight text summaries (not base64 blobs) for
+        # each attachment to prevent context growth across multi-turn sessions.
+        # Filenames come from the Telegram payload and are user-controlled, so
+        # each one must be sanitized before being appended to history_text.
+        # On injection detection the filename is replaced with its safe type label.
+        history_text = clean_text
+        if message.attachments:
+            safe_summaries: list[str] = []
+            for a in message.attachments:
+                label = _TYPE_LABEL[a.type]
+                safe_name = self._sanitize_filename(a.file_name)
+                if safe_name is None:
+                    safe_name = label  # fall back to enum label only
+                safe_summaries.append(f"[{label}: {safe_name}]")
+            summaries = " ".join(safe_summaries)
+            history_text = f"{clean_text} {summaries}".strip()
+
+        # For the current (last) message, send the full multimodal content.
+        # All prior history entries remain as text summaries. Stored
+        # (role, content) pairs are expanded to message dicts in one pass and
+        # the last entry (the summary just appended) is swapped for the
+        # multimodal message in place.
+        current = {"role": "user", "content": _build_content_parts(clean_text, message.attachments)}
+
+        # Hold the session lock across the upstream call so concurrent
+        # relays from one sender append their turns in order; other
+        # sessions are unaffected.
+        async with history.lock(session_id):
+            history.append_user(session_id, history_text)
+            messages: list[dict[str, Any]] = [
+                {"role": role, "content": content}
+                for role, content in history.view(session_id)
+            ]
+            messages[-1] = current
+            upstream_response = await self._forward(
+                _request_body(message, messages),
+            )
+            # Update history with assistant reply (only on success)
+            if upstream_response.status_code == 200:
+                history.append_assistant(session_id, upstream_response.text)
+        return upstream_response
+
+    def _sanitize_filename(self, name: str) -> str | None:
+        """Return the sanitized filename, or None if it trips injection detection.
+
+        Senders often re-send the same file or sticker, so names with no
+        detection at all are kept in a bounded per-pipeline LRU cache.
+        Anything the sanitizer flagged goes through sanitize() again each
+        time, so every attempt still raises its audit event.
+        """
+        cache = self._filename_cache
+        cached = cache.get(name)
+        if cached is not None:
+            cache.move_to_end(name)
+            return cached
+        try:
+            result = self._sanitizer.sanitize(name)
+        except PromptInjectionError:
+            return None
+        if not result.injection_detected:
+            cache[name] = result.clean
+            if len(cache) > _FILENAME_CACHE_SIZE:
+                cache.popitem(last=False)
+        return result.clean
+
     async def _forward_to_upstream(
         self, request_body: dict[str, Any],
     ) -> WebhookResponse:
         """Forward translated request to OpenClaw upstream."""
-        url = f"{self._upstream_url.rstrip('/')}/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {self._upstream_token}",
-            "Content-Type": "application/json",
-        }
+        # Serialize up front with orjson: multimodal bodies carry megabytes of
+        # base64 text, which the stdlib encoder httpx uses for json= is slow on.
+        body = orjson.dumps(request_body)
 
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.post(
-                    url, json=request_body, headers=headers, timeout=30.0,
-                )
-                # Extract assistant message from response
-                try:
-                    resp_json = resp.json()
-                    text = (
-                        resp_json.get("choices", [{}])[0]
-                        .get("message", {})
-                        .get("content", resp.text)
-                    )
-                except (json.JSONDecodeError, IndexError, KeyError):
-                    text = resp.text
-
-                return WebhookResponse(text=text, status_code=resp.status_code)
+            resp = await self._get_client().post(
+                self._upstream_post_url,
+                content=body,
+                headers=self._upstream_headers,
+                timeout=30.0,
+            )
         except (httpx.ConnectError, httpx.TimeoutException):
             return WebhookResponse(
                 text="Upstream unavailable",
                 status_code=502,
             )
+
+        # Extract assistant message from response. The body is parsed straight
+        # from bytes; resp.text (a full decode) is only built on fallback.
+        try:
+            reply = orjson.loads(resp.content).get("choices", [{}])[0].get("message", {})
+        except (orjson.JSONDecodeError, IndexError, KeyError):
+            reply = {}
+        # Not reply.get("content", resp.text): that default would decode eagerly.
+        text = reply["content"] if "content" in reply else resp.text  # noqa: SIM401
+
+        return WebhookResponse(text=text, status_code=resp.status_code)
@@ -22,7 +22,11 @@ logger = logging.getLogger(__name__)
 
 _MAX_RETRIES = 3
 _BACKOFF_CAP_SECONDS = 30
+# Delay before retry N (exponential, capped); one entry per retry.
+_BACKOFF_SCHEDULE = tuple(min(1 << i, _BACKOFF_CAP_SECONDS) for i in range(_MAX_RETRIES))
 _MAX_FILE_SIZE = 20 * 1024 * 1024  # 20MB Telegram file size limit
+_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+_CLIENT_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
 
 
 @dataclass
@@ -51,7 +55,24 @@ class TelegramRelay:
 
     def __init__(self, bot_token: str) -> None:
         self._bot_token = bot_token
-        self._secret_hash = hashlib.sha256(bot_token.encode()).hexdigest()
+        # Hex digest kept as ASCII bytes so each verification compares raw buffers.
+        self._secret_hash = hashlib.sha256(bot_token.encode()).hexdigest().encode("ascii")
+        self._client: httpx.AsyncClient | None = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared api.telegram.org client, creating it on first use.
+
+        NFR-9: TLS certificate verification enabled.
+        """
+        if self._client is None:
+            self._client = httpx.AsyncClient(verify=True, limits=_CLIENT_LIMITS)
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the shared Telegram client, if one was opened."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     def verify_webhook(self, headers: dict[str, str]) -> bool:
         """Verify Telegram webhook using secret token header.
@@ -62,7 +83,7 @@ class TelegramRelay:
         secret = headers.get("x-telegram-bot-api-secret-token", "")
         if not secret:
             return False
-        return hmac.compare_digest(secret, self._secret_hash)
+        return hmac.compare_digest(secret.encode(), self._secret_hash)
 
     def extract_message(self, update: dict[str, Any]) -> TelegramExtraction:
         """Extract update_id, text, chat_id, and file metadata from a Telegram update.
@@ -160,15 +181,19 @@ class TelegramRelay:
 
         return infos
 
-    async def download_file(self, file_id: str) -> bytes:
+    async def download_file(self, file_id: str) -> memoryview:
         """Download a file from Telegram by file_id.
 
         Two-step process:
         1. GET /bot{token}/getFile?file_id=... → get file_path
-        2. GET /file/bot{token}/{file_path} → download bytes
+        2. GET /file/bot{token}/{file_path} → stream bytes
+
+        The body is streamed into a buffer preallocated from the reported
+        file_size and returned as a read-only memoryview, so the download is
+        held in memory exactly once.
 
         Security: TLS verification enabled, 20MB size cap enforced both
-        pre-download (via metadata) and post-download (on actual bytes).
+        pre-download (via metadata) and during download (on actual bytes).
         URLs are constructed from hardcoded api.telegram.org only — no SSRF risk.
         """
         get_file_url = (
@@ -176,35 +201,42 @@ class TelegramRelay:
             f"?file_id={file_id}"
         )
 
-        async with httpx.AsyncClient(verify=True) as client:
-            resp = await client.get(get_file_url)
-            resp.raise_for_status()
-            data = resp.json()
+        client = self._get_client()
+        resp = await client.get(get_file_url)
+        resp.raise_for_status()
+        data = resp.json()
 
-            if not data.get("ok"):
-                raise ValueError(f"Telegram getFile returned not-ok: {data}")
+        if not data.get("ok"):
+            raise ValueError(f"Telegram getFile returned not-ok: {data}")
 
-            file_path = data["result"]["file_path"]
-            file_size = data["result"].get("file_size", 0)
+        file_path = data["result"]["file_path"]
+        file_size = data["result"].get("file_size", 0)
 
-            if file_size > _MAX_FILE_SIZE:
-                raise ValueError(
-                    f"File too large: {file_size} bytes (max {_MAX_FILE_SIZE})"
-                )
-
-            download_url = (
-                f"https://api.telegram.org/file/bot{self._bot_token}/{file_path}"
+        if file_size > _MAX_FILE_SIZE:
+            raise ValueError(
+                f"File too large: {file_size} bytes (max {_MAX_FILE_SIZE})"
             )
-            file_resp = await client.get(download_url)
-            file_resp.raise_for_status()
-
-            content = file_resp.content
-            if len(content) > _MAX_FILE_SIZE:
-                raise ValueError(
-                    f"Downloaded file too large: {len(content)} bytes (max {_MAX_FILE_SIZE})"
-                )
 
-            return content
+        download_url = (
+            f"https://api.telegram.org/file/bot{self._bot_token}/{file_path}"
+        )
+        buf = bytearray(file_size)
+        received = 0
+        async with client.stream("GET", download_url) as file_resp:
+            file_resp.raise_for_status()
+            async for chunk in file_resp.aiter_bytes(_DOWNLOAD_CHUNK_SIZE):
+                end = received + len(chunk)
+                if end > _MAX_FILE_SIZE:
+                    raise ValueError(
+                        f"Downloaded file too large: over {_MAX_FILE_SIZE} bytes"
+                    )
+                # Fills the preallocated buffer in place; grows it only if the
+                # server sends more than getFile reported.
+                buf[received:end] = chunk
+                received = end
+
+        view = memoryview(buf).toreadonly()
+        return view if received == len(buf) else view[:received]
 
     async def build_attachments(
         self,
@@ -212,44 +244,51 @@ class TelegramRelay:
         audit_logger: Any = None,
         sender_id: str = "",
     ) -> list[Attachment]:
-        """Download all files and return as Attachment list.
+        """Download all files concurrently and return as Attachment list.
 
         Failures are logged as warnings and skipped — one bad file does not
         prevent the rest of the message from being processed.
         """
-        attachments: list[Attachment] = []
-        for info in file_infos:
+        async def _download(info: TelegramFileInfo) -> memoryview | None:
             try:
-                data = await self.download_file(info.file_id)
-                attachments.append(Attachment(
-                    type=info.file_type,
-                    file_id=info.file_id,
-                    mime_type=info.mime_type,
-                    file_name=info.file_name,
-                    file_size=len(data),
-                    data=data,
-                ))
-                if audit_logger:
-                    from src.models import AuditEvent
-                    audit_logger.log(AuditEvent(
-                        event_type=AuditEventType.WEBHOOK_FILE_DOWNLOAD,
-                        action="file_download",
-                        result="success",
-                        risk_level=RiskLevel.INFO,
-                        details={
-                            "file_type": info.file_type.value,
-                            "mime_type": info.mime_type,
-                            "file_name": info.file_name,
-                            "file_size": len(data),
-                            "sender_id": sender_id,
-                        },
-                    ))
+                return await self.download_file(info.file_id)
             except Exception:
                 logger.warning(
                     "Failed to download Telegram file %s (%s), skipping",
                     info.file_id,
                     info.file_type.value,
                 )
+                return None
+
+        results = await asyncio.gather(*(_download(info) for info in file_infos))
+
+        attachments: list[Attachment] = []
+        for info, data in zip(file_infos, results, strict=True):
+            if data is None:
+                continue
+            attachments.append(Attachment(
+                type=info.file_type,
+                file_id=info.file_id,
+                mime_type=info.mime_type,
+                file_name=info.file_name,
+                file_size=len(data),
+                data=data,
+            ))
+            if audit_logger:
+                from src.models import AuditEvent
+                audit_logger.log(AuditEvent(
+                    event_type=AuditEventType.WEBHOOK_FILE_DOWNLOAD,
+                    action="file_download",
+                    result="success",
+                    risk_level=RiskLevel.INFO,
+                    details={
+                        "file_type": info.file_type.value,
+                        "mime_type": info.mime_type,
+                        "file_name": info.file_name,
+                        "file_size": len(data),
+                        "sender_id": sender_id,
+                    },
+                ))
 
         return attachments
 
@@ -270,17 +309,16 @@ class TelegramRelay:
         url = f"https://api.telegram.org/bot{self._bot_token}/sendMessage"
         payload = {"chat_id": chat_id, "text": text}
 
-        async with httpx.AsyncClient(verify=True) as client:
-            for attempt in range(_MAX_RETRIES + 1):
-                resp = await client.post(url, json=payload)
-
-                if resp.status_code < 400:
-                    return
-                if not self._should_retry(resp.status_code):
-                    return
-                if attempt < _MAX_RETRIES:
-                    delay = min(2 ** attempt, _BACKOFF_CAP_SECONDS)
-                    await asyncio.sleep(delay)
+        client = self._get_client()
+        for attempt in range(_MAX_RETRIES + 1):
+            resp = await client.post(url, json=payload)
+
+            if resp.status_code < 400:
+                return
+            if not self._should_retry(resp.status_code):
+                return
+            if attempt < _MAX_RETRIES:
+                await asyncio.sleep(_BACKOFF_SCHEDULE[attempt])
 
     @staticmethod
     def _should_retry(status_code: int) -> bool:
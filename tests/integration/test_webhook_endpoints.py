@@ -183,6 +183,20 @@ class TestWebhookRouteRegistration:
         routes = [r.path for r in app.routes]
         assert "/webhook/whatsapp" not in routes
 
+    @pytest.mark.asyncio
+    async def test_shutdown_closes_relay_clients(self, tmp_path: Path) -> None:
+        """Shared relay HTTP clients are closed when the app shuts down."""
+        pipeline_cls = "src.webhook.relay.WebhookRelayPipeline"
+        with (
+            patch(f"{pipeline_cls}.aclose", new_callable=AsyncMock) as pipe_close,
+            patch("src.webhook.telegram.TelegramRelay.aclose", new_callable=AsyncMock) as tg_close,
+        ):
+            app = _make_app_with_sanitizer(tmp_path, telegram_bot_token="123:ABC")
+            async with app.router.lifespan_context(app):
+                pipe_close.assert_not_awaited()
+            pipe_close.assert_awaited_once()
+            tg_close.assert_awaited_once()
+
 
 class TestTelegramEndpoints:
     """Telegram webhook endpoint integration tests."""
@@ -226,16 +240,21 @@ class TestTelegramEndpoints:
                 mock_fwd = AsyncMock()
                 mock_resp = MagicMock()
                 mock_resp.status_code = 200
-                mock_resp.json.return_value = {"choices": [{"message": {"content": "ok"}}]}
+                mock_resp.content = b'{"choices": [{"message": {"content": "ok"}}]}'
                 mock_resp.text = "ok"
                 mock_fwd.post.return_value = mock_resp
                 mock_fwd.__aenter__ = AsyncMock(return_value=mock_fwd)
                 mock_fwd.__aexit__ = AsyncMock(return_value=False)
                 mock_fwd_cls.return_value = mock_fwd
 
-                # Mock Telegram API (send_response)
+                # Mock Telegram API (send_response).
+                # Both patches target the shared httpx module, so this mock also
+                # serves the upstream call and needs a parseable body.
                 mock_tg = AsyncMock()
-                mock_tg.post.return_value = MagicMock(status_code=200)
+                mock_tg.post.return_value = MagicMock(
+                    status_code=200,
+                    content=b'{"choices": [{"message": {"content": "ok"}}]}',
+                )
                 mock_tg.__aenter__ = AsyncMock(return_value=mock_tg)
                 mock_tg.__aexit__ = AsyncMock(return_value=False)
                 mock_tg_cls.return_value = mock_tg
@@ -273,15 +292,20 @@ class TestTelegramEndpoints:
                 mock_fwd = AsyncMock()
                 mock_resp = MagicMock()
                 mock_resp.status_code = 200
-                mock_resp.json.return_value = {"choices": [{"message": {"content": "ok"}}]}
+                mock_resp.content = b'{"choices": [{"message": {"content": "ok"}}]}'
                 mock_resp.text = "ok"
                 mock_fwd.post.return_value = mock_resp
                 mock_fwd.__aenter__ = AsyncMock(return_value=mock_fwd)
                 mock_fwd.__aexit__ = AsyncMock(return_value=False)
                 mock_fwd_cls.return_value = mock_fwd
 
+                # Both patches target the shared httpx module, so this mock also
+                # serves the upstream call and needs a parseable body.
                 mock_tg = AsyncMock()
-                mock_tg.post.return_value = MagicMock(status_code=200)
+                mock_tg.post.return_value = MagicMock(
+                    status_code=200,
+                    content=b'{"choices": [{"message": {"content": "ok"}}]}',
+                )
                 mock_tg.__aenter__ = AsyncMock(return_value=mock_tg)
                 mock_tg.__aexit__ = AsyncMock(return_value=False)
                 mock_tg_cls.return_value = mock_tg
@@ -2,9 +2,18 @@
 
 from __future__ import annotations
 
+import asyncio
+import errno
+import time
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
 import pytest
 
+from src.sanitizer.sanitizer import PromptSanitizer
 from src.webhook.history import ConversationHistory
+from src.webhook.models import WebhookMessage, WebhookResponse
+from src.webhook.relay import WebhookRelayPipeline
 
 
 class TestConversationHistory:
@@ -55,6 +64,15 @@ class TestConversationHistory:
 
         assert len(history.get("user-1")) == 1
 
+    def test_view_reads_history_without_copy(self) -> None:
+        history = ConversationHistory()
+        assert len(history.view("user-1")) == 0
+
+        history.append_user("user-1", "hello")
+        view = history.view("user-1")
+        assert list(view) == [("user", "hello")]
+        assert history.view("user-1") is view  # same stored object each call
+
     def test_truncation_drops_oldest_messages(self) -> None:
         history = ConversationHistory(max_turns=2)  # max 4 messages
         for i in range(3):  # 3 turns = 6 messages → drop first 2
@@ -67,6 +85,32 @@ class TestConversationHistory:
         assert msgs[0] == {"role": "user", "content": "user 1"}
         assert msgs[-1] == {"role": "assistant", "content": "bot 2"}
 
+    def test_truncation_keeps_stored_deque_bounded(self) -> None:
+        history = ConversationHistory(max_turns=1)
+        for i in range(100):
+            history.append_user("user-1", f"user {i}")
+        assert len(history.view("user-1")) == 2
+
+    def test_zero_max_turns_rejected(self) -> None:
+        with pytest.raises(ValueError, match="max_turns"):
+            ConversationHistory(max_turns=0)
+
+    def test_zero_max_sessions_rejected(self) -> None:
+        with pytest.raises(ValueError, match="max_sessions"):
+            ConversationHistory(max_sessions=0)
+
+    def test_assistant_reply_does_not_reopen_missing_session(self) -> None:
+        history = ConversationHistory(max_sessions=1)
+        history.append_user("a", "hello")
+        history.clear("a")
+        history.append_assistant("a", "late reply")
+        assert history.get("a") == []
+
+        history.append_user("b", "hello")
+        history.append_assistant("c", "stray reply")  # would have pushed past the cap
+        assert history.get("c") == []
+        assert len(history.get("b")) == 1
+
     def test_clear_removes_session(self) -> None:
         history = ConversationHistory()
         history.append_user("user-1", "hello")
@@ -79,8 +123,6 @@ class TestConversationHistory:
 
     def test_stale_sessions_are_evicted(self) -> None:
         """P2: Sessions inactive beyond TTL are removed on next append_user."""
-        import time
-
         history = ConversationHistory(session_ttl_seconds=0.01)  # 10ms TTL
         history.append_user("old-user", "hello")
         assert len(history.get("old-user")) == 1
@@ -99,6 +141,173 @@ class TestConversationHistory:
         history.append_user("trigger", "hi")  # triggers eviction scan
         assert len(history.get("active")) == 1  # still alive
 
+    def test_recent_activity_protects_older_session(self) -> None:
+        """Eviction follows last activity, not session creation order."""
+        clock = [0]
+        history = ConversationHistory(session_ttl_seconds=60)
+        with patch("src.webhook.history.time.monotonic_ns", side_effect=lambda: clock[0]):
+            history.append_user("first", "hello")
+            history.append_user("second", "hello")
+            clock[0] = 50 * 10**9
+            history.append_assistant("first", "reply")  # touch after "second"
+            clock[0] = 100 * 10**9
+            history.append_user("trigger", "hi")
+
+        assert len(history.get("first")) == 2  # active 50s ago
+        assert history.get("second") == []  # idle for 100s
+
+    def test_session_cap_evicts_least_recently_active(self) -> None:
+        history = ConversationHistory(max_sessions=1000)
+        for i in range(1000):
+            history.append_user(f"user-{i}", "hello")
+        history.append_assistant("user-0", "reply")  # user-1 is now the LRU session
+
+        history.append_user("user-1000", "hello")
+
+        assert history.get("user-1") == []
+        assert len(history.get("user-0")) == 2
+        assert len(history.get("user-1000")) == 1
+
+    def test_session_cap_ignores_existing_sessions(self) -> None:
+        history = ConversationHistory(max_sessions=2)
+        history.append_user("a", "one")
+        history.append_user("b", "one")
+        history.append_user("a", "two")  # existing session: nothing evicted
+
+        assert len(history.get("a")) == 2
+        assert len(history.get("b")) == 1
+
+    async def test_lock_is_per_session(self) -> None:
+        history = ConversationHistory()
+        entered: list[str] = []
+
+        async def enter(key: str) -> None:
+            async with history.lock(key):
+                entered.append(key)
+
+        async with history.lock("a"):
+            same, other = asyncio.create_task(enter("a")), asyncio.create_task(enter("b"))
+            await asyncio.sleep(0)
+            assert entered == ["b"]  # other sessions are not blocked
+            assert history.get("a") == []  # lock alone stores no messages
+        await asyncio.gather(same, other)
+        assert entered == ["b", "a"]
+
+    async def test_session_in_use_is_not_evicted(self) -> None:
+        history = ConversationHistory(max_sessions=1)
+        async with history.lock("a"):
+            history.append_user("a", "one")
+            history.append_user("b", "one")  # over the cap, but "a" is in flight
+            assert len(history.get("a")) == 1
+        history.append_user("c", "one")  # "a" is idle again and the oldest
+
+        assert history.get("a") == []
+        assert history.get("b") == []
+        assert len(history.get("c")) == 1
+
+
+class TestConversationHistoryPersistence:
+    """Optional JSONL append log, replayed on startup and compacted as it grows."""
+
+    def test_history_survives_restart(self, tmp_path: Path) -> None:
+        path = tmp_path / "history.jsonl"
+        history = ConversationHistory(persistence_path=path)
+        history.append_user(("telegram", "u1"), "hello")
+        history.append_assistant(("telegram", "u1"), "hi there")
+        history.flush()
+
+        restored = ConversationHistory(persistence_path=path)
+        assert restored.get(("telegram", "u1")) == [
+            {"role": "user", "content": "hello"},
+            {"role": "assistant", "content": "hi there"},
+        ]
+
+    def test_records_buffered_until_flush_threshold(self, tmp_path: Path) -> None:
+        path = tmp_path / "history.jsonl"
+        history = ConversationHistory(persistence_path=path, flush_every=3)
+        history.append_user("u1", "one")
+        history.append_assistant("u1", "two")
+        assert path.read_bytes() == b""  # nothing written yet
+
+        history.append_user("u1", "three")
+        assert len(path.read_bytes().splitlines()) == 3
+
+    def test_cleared_session_not_restored(self, tmp_path: Path) -> None:
+        path = tmp_path / "history.jsonl"
+        history = ConversationHistory(persistence_path=path)
+        history.append_user("u1", "hello")
+        history.append_user("u2", "hello")
+        history.clear("u1")
+        history.flush()
+
+        restored = ConversationHistory(persistence_path=path)
+        assert restored.get("u1") == []
+        assert len(restored.get("u2")) == 1
+
+    def test_startup_compacts_log_to_live_messages(self, tmp_path: Path) -> None:
+        path = tmp_path / "history.jsonl"
+        history = ConversationHistory(max_turns=1, persistence_path=path)
+        for i in range(5):
+            history.append_user("u1", f"user {i}")
+            history.append_assistant("u1", f"bot {i}")
+        history.flush()
+        assert len(path.read_bytes().splitlines()) == 10
+
+        restored = ConversationHistory(max_turns=1, persistence_path=path)
+        assert len(path.read_bytes().splitlines()) == 2
+        assert [m["content"] for m in restored.get("u1")] == ["user 4", "bot 4"]
+        assert not path.with_name("history.jsonl.tmp").exists()
+
+    def test_log_compacted_at_runtime(self, tmp_path: Path) -> None:
+        path = tmp_path / "history.jsonl"
+        with patch("src.webhook.history._COMPACT_MIN_RECORDS", 4):
+            history = ConversationHistory(persistence_path=path, flush_every=1)
+        history.append_user("u1", "secret")
+        history.clear("u1")
+        history.append_user("u2", "one")
+        assert len(path.read_bytes().splitlines()) == 3
+
+        history.append_user("u2", "two")  # fourth record reaches the threshold
+        log = path.read_bytes()
+        assert len(log.splitlines()) == 2
+        assert b"secret" not in log
+        assert [m["content"] for m in history.get("u2")] == ["one", "two"]
+
+    def test_failed_write_is_logged_and_retried(
+        self, tmp_path: Path, caplog: pytest.LogCaptureFixture,
+    ) -> None:
+        path = tmp_path / "history.jsonl"
+        history = ConversationHistory(persistence_path=path, flush_every=1)
+        disk_full = OSError(errno.ENOSPC, "No space left on device")
+        with patch("src.webhook.history.os.open", side_effect=disk_full):
+            history.append_user("u1", "hello")  # must not raise
+        assert "Failed to write conversation history" in caplog.text
+        assert path.read_bytes() == b""
+
+        history.append_user("u1", "again")
+        restored = ConversationHistory(persistence_path=path)
+        assert [m["content"] for m in restored.get("u1")] == ["hello", "again"]
+
+    def test_truncated_record_is_skipped(self, tmp_path: Path) -> None:
+        path = tmp_path / "history.jsonl"
+        history = ConversationHistory(persistence_path=path)
+        history.append_user("u1", "hello")
+        history.flush()
+        with open(path, "ab") as f:
+            f.write(b'{"op": "append", "key": "u1", "ro')  # crash mid-write
+
+        restored = ConversationHistory(persistence_path=path)
+        assert restored.get("u1") == [{"role": "user", "content": "hello"}]
+
+    def test_ttl_counts_time_before_restart(self, tmp_path: Path) -> None:
+        path = tmp_path / "history.jsonl"
+        path.write_text(
+            '{"op": "append", "key": "old", "role": "user", "content": "hi", '
+            f'"ts": {time.time() - 120}}}\n'
+        )
+        restored = ConversationHistory(session_ttl_seconds=60, persistence_path=path)
+        assert restored.get("old") == []
+
 
 class TestWebhookRelayWithHistory:
     """Integration: history wired into WebhookRelayPipeline."""
@@ -106,31 +315,26 @@ class TestWebhookRelayWithHistory:
     @pytest.mark.asyncio
     async def test_history_builds_up_across_relays(self) -> None:
         """Second relay call sends both turns to upstream."""
-        from unittest.mock import AsyncMock, MagicMock, patch
-
-        from src.webhook.history import ConversationHistory
-        from src.webhook.models import WebhookMessage, WebhookResponse
-        from src.webhook.relay import WebhookRelayPipeline
-
-        sanitizer = MagicMock()
+        sanitizer = MagicMock(spec=PromptSanitizer, blocking=False)
         sanitizer.sanitize.side_effect = lambda t: MagicMock(clean=t, injection_detected=False)
         history = ConversationHistory()
+        mock_fwd = AsyncMock()
         pipeline = WebhookRelayPipeline(
             sanitizer=sanitizer,
             upstream_url="http://openclaw:3000",
             upstream_token="tok",
             conversation_history=history,
+            forward_fn=mock_fwd,
         )
 
         msg1 = WebhookMessage(source="telegram", text="hi", sender_id="u1", metadata={})
         msg2 = WebhookMessage(source="telegram", text="what time is it?", sender_id="u1", metadata={})
 
-        with patch.object(pipeline, "_forward_to_upstream", new_callable=AsyncMock) as mock_fwd:
-            mock_fwd.return_value = WebhookResponse(text="hello!", status_code=200)
-            await pipeline.relay(msg1)
+        mock_fwd.return_value = WebhookResponse(text="hello!", status_code=200)
+        await pipeline.relay(msg1)
 
-            mock_fwd.return_value = WebhookResponse(text="it is noon", status_code=200)
-            await pipeline.relay(msg2)
+        mock_fwd.return_value = WebhookResponse(text="it is noon", status_code=200)
+        await pipeline.relay(msg2)
 
         # The second upstream call receives: [user: hi, assistant: hello!, user: what time?]
         # (the assistant reply "it is noon" is appended AFTER the upstream call returns)
@@ -141,71 +345,61 @@ class TestWebhookRelayWithHistory:
         assert messages[1] == {"role": "assistant", "content": "hello!"}
         assert messages[2] == {"role": "user", "content": "what time is it?"}
 
-        # Full history after both turns has 4 messages, keyed by source:sender_id
-        assert len(history.get("telegram:u1")) == 4
+        # Full history after both turns has 4 messages, keyed by (source, sender_id)
+        assert len(history.get(("telegram", "u1"))) == 4
 
     @pytest.mark.asyncio
     async def test_history_not_updated_on_upstream_error(self) -> None:
         """Failed upstream response does not append assistant message."""
-        from unittest.mock import AsyncMock, MagicMock, patch
-
-        from src.webhook.history import ConversationHistory
-        from src.webhook.models import WebhookMessage, WebhookResponse
-        from src.webhook.relay import WebhookRelayPipeline
-
-        sanitizer = MagicMock()
+        sanitizer = MagicMock(spec=PromptSanitizer, blocking=False)
         sanitizer.sanitize.side_effect = lambda t: MagicMock(clean=t, injection_detected=False)
         history = ConversationHistory()
+        mock_fwd = AsyncMock(
+            return_value=WebhookResponse(text="Upstream unavailable", status_code=502),
+        )
         pipeline = WebhookRelayPipeline(
             sanitizer=sanitizer,
             upstream_url="http://openclaw:3000",
             upstream_token="tok",
             conversation_history=history,
+            forward_fn=mock_fwd,
         )
 
         msg = WebhookMessage(source="telegram", text="hello", sender_id="u1", metadata={})
 
-        with patch.object(pipeline, "_forward_to_upstream", new_callable=AsyncMock) as mock_fwd:
-            mock_fwd.return_value = WebhookResponse(text="Upstream unavailable", status_code=502)
-            await pipeline.relay(msg)
+        await pipeline.relay(msg)
 
         # Only the user message should be in history; no assistant reply
-        msgs = history.get("telegram:u1")
+        msgs = history.get(("telegram", "u1"))
         assert len(msgs) == 1
         assert msgs[0]["role"] == "user"
 
     @pytest.mark.asyncio
     async def test_sessions_isolated_across_senders(self) -> None:
         """Two different senders maintain independent histories."""
-        from unittest.mock import AsyncMock, MagicMock, patch
-
-        from src.webhook.history import ConversationHistory
-        from src.webhook.models import WebhookMessage, WebhookResponse
-        from src.webhook.relay import WebhookRelayPipeline
-
-        sanitizer = MagicMock()
+        sanitizer = MagicMock(spec=PromptSanitizer, blocking=False)
         sanitizer.sanitize.side_effect = lambda t: MagicMock(clean=t, injection_detected=False)
         history = ConversationHistory()
+        mock_fwd = AsyncMock(return_value=WebhookResponse(text="ok", status_code=200))
         pipeline = WebhookRelayPipeline(
             sanitizer=sanitizer,
             upstream_url="http://openclaw:3000",
             upstream_token="tok",
             conversation_history=history,
+            forward_fn=mock_fwd,
         )
 
         alice = WebhookMessage(source="telegram", text="alice msg", sender_id="alice", metadata={})
         bob = WebhookMessage(source="telegram", text="bob msg", sender_id="bob", metadata={})
 
-        with patch.object(pipeline, "_forward_to_upstream", new_callable=AsyncMock) as mock_fwd:
-            mock_fwd.return_value = WebhookResponse(text="ok", status_code=200)
-            await pipeline.relay(alice)
-            await pipeline.relay(bob)
+        await pipeline.relay(alice)
+        await pipeline.relay(bob)
 
-        assert history.get("telegram:alice") == [
+        assert history.get(("telegram", "alice")) == [
             {"role": "user", "content": "alice msg"},
             {"role": "assistant", "content": "ok"},
         ]
-        assert history.get("telegram:bob") == [
+        assert history.get(("telegram", "bob")) == [
             {"role": "user", "content": "bob msg"},
             {"role": "assistant", "content": "ok"},
         ]
@@ -213,58 +407,116 @@ class TestWebhookRelayWithHistory:
     @pytest.mark.asyncio
     async def test_same_id_different_channels_isolated(self) -> None:
         """P1: Same numeric ID on Telegram vs WhatsApp uses separate sessions."""
-        from unittest.mock import AsyncMock, MagicMock, patch
-
-        from src.webhook.history import ConversationHistory
-        from src.webhook.models import WebhookMessage, WebhookResponse
-        from src.webhook.relay import WebhookRelayPipeline
-
-        sanitizer = MagicMock()
+        sanitizer = MagicMock(spec=PromptSanitizer, blocking=False)
         sanitizer.sanitize.side_effect = lambda t: MagicMock(clean=t, injection_detected=False)
         history = ConversationHistory()
+        mock_fwd = AsyncMock(return_value=WebhookResponse(text="ok", status_code=200))
         pipeline = WebhookRelayPipeline(
             sanitizer=sanitizer,
             upstream_url="http://openclaw:3000",
             upstream_token="tok",
             conversation_history=history,
+            forward_fn=mock_fwd,
         )
 
         tg_msg = WebhookMessage(source="telegram", text="from telegram", sender_id="12345", metadata={})
         wa_msg = WebhookMessage(source="whatsapp", text="from whatsapp", sender_id="12345", metadata={})
 
-        with patch.object(pipeline, "_forward_to_upstream", new_callable=AsyncMock) as mock_fwd:
-            mock_fwd.return_value = WebhookResponse(text="ok", status_code=200)
-            await pipeline.relay(tg_msg)
-            await pipeline.relay(wa_msg)
+        await pipeline.relay(tg_msg)
+        await pipeline.relay(wa_msg)
 
-        tg_history = history.get("telegram:12345")
-        wa_history = history.get("whatsapp:12345")
+        tg_history = history.get(("telegram", "12345"))
+        wa_history = history.get(("whatsapp", "12345"))
         assert len(tg_history) == 2  # user + assistant
         assert len(wa_history) == 2  # user + assistant
         assert tg_history[0]["content"] == "from telegram"
         assert wa_history[0]["content"] == "from whatsapp"
 
     @pytest.mark.asyncio
-    async def test_relay_without_history_still_works(self) -> None:
-        """Backward compat: no conversation_history → single-message relay."""
-        from unittest.mock import AsyncMock, MagicMock, patch
+    async def test_concurrent_relays_for_one_sender_are_serialized(self) -> None:
+        """Overlapping relays from one sender append whole turns in order."""
+        sanitizer = MagicMock(spec=PromptSanitizer, blocking=False)
+        sanitizer.sanitize.side_effect = lambda t: MagicMock(clean=t, injection_detected=False)
+        history = ConversationHistory()
+
+        sent: list[list[dict]] = []
+
+        async def fake_forward(body: dict) -> WebhookResponse:
+            sent.append(body["messages"])
+            await asyncio.sleep(0.01)  # yield while "upstream" is busy
+            return WebhookResponse(text=f"reply {len(sent)}", status_code=200)
+
+        pipeline = WebhookRelayPipeline(
+            sanitizer=sanitizer,
+            upstream_url="http://openclaw:3000",
+            upstream_token="tok",
+            conversation_history=history,
+            forward_fn=fake_forward,
+        )
+
+        msgs = [
+            WebhookMessage(source="telegram", text=f"msg {i}", sender_id="u1", metadata={})
+            for i in (1, 2)
+        ]
+        await asyncio.gather(*(pipeline.relay(m) for m in msgs))
+
+        # The second request already sees the first full turn
+        assert len(sent[1]) == 3
+        assert [m["content"] for m in history.get(("telegram", "u1"))] == [
+            "msg 1", "reply 1", "msg 2", "reply 2",
+        ]
 
-        from src.webhook.models import WebhookMessage, WebhookResponse
-        from src.webhook.relay import WebhookRelayPipeline
+    @pytest.mark.asyncio
+    async def test_session_cap_does_not_break_ordering_under_burst(self) -> None:
+        """More concurrent senders than max_sessions still keep each turn in order."""
+        sanitizer = MagicMock(spec=PromptSanitizer, blocking=False)
+        sanitizer.sanitize.side_effect = lambda t: MagicMock(clean=t, injection_detected=False)
+        history = ConversationHistory(max_sessions=2)
+
+        sent: dict[str, list[str]] = {}
+
+        async def fake_forward(body: dict) -> WebhookResponse:
+            contents = [m["content"] for m in body["messages"]]
+            sent[contents[-1]] = contents
+            await asyncio.sleep(0.01)  # keep every relay in flight together
+            return WebhookResponse(text=f"re {contents[-1]}", status_code=200)
+
+        pipeline = WebhookRelayPipeline(
+            sanitizer=sanitizer,
+            upstream_url="http://openclaw:3000",
+            upstream_token="tok",
+            conversation_history=history,
+            forward_fn=fake_forward,
+        )
 
-        sanitizer = MagicMock()
+        msgs = [
+            WebhookMessage(source="telegram", text=text, sender_id=text[0], metadata={})
+            for text in ("a1", "b1", "c1", "a2")
+        ]
+        await asyncio.gather(*(pipeline.relay(m) for m in msgs))
+
+        # a2 waited for a1's whole turn instead of running on a fresh session
+        assert sent["a2"] == ["a1", "re a1", "a2"]
+        assert [m["content"] for m in history.get(("telegram", "a"))] == [
+            "a1", "re a1", "a2", "re a2",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_relay_without_history_still_works(self) -> None:
+        """Backward compat: no conversation_history → single-message relay."""
+        sanitizer = MagicMock(spec=PromptSanitizer, blocking=False)
         sanitizer.sanitize.return_value = MagicMock(clean="hello", injection_detected=False)
+        mock_fwd = AsyncMock(return_value=WebhookResponse(text="world", status_code=200))
         pipeline = WebhookRelayPipeline(
             sanitizer=sanitizer,
             upstream_url="http://openclaw:3000",
             upstream_token="tok",
+            forward_fn=mock_fwd,
         )
 
         msg = WebhookMessage(source="telegram", text="hello", sender_id="u1", metadata={})
 
-        with patch.object(pipeline, "_forward_to_upstream", new_callable=AsyncMock) as mock_fwd:
-            mock_fwd.return_value = WebhookResponse(text="world", status_code=200)
-            result = await pipeline.relay(msg)
+        result = await pipeline.relay(msg)
 
         assert result.text == "world"
         sent_body = mock_fwd.call_args[0][0]
@@ -2,57 +2,146 @@
 
 from __future__ import annotations
 
+import asyncio
+import functools
 import hashlib
+from collections.abc import Callable
+from types import MappingProxyType, SimpleNamespace
+from typing import Any
 from unittest.mock import AsyncMock, MagicMock, patch
 
+import httpx
 import pytest
 
 from src.webhook.models import Attachment, AttachmentType
 from src.webhook.telegram import TelegramExtraction, TelegramFileInfo, TelegramRelay
 
+_BOT_TOKEN = "123:ABC"
+# Shared message shell; _upd() layers each test's message fields over it.
+_BASE_MSG = MappingProxyType({"chat": {"id": 1}})
 
+
+def _upd(**message_extras: Any) -> dict[str, Any]:
+    """Build a Telegram update whose message carries the given fields."""
+    return {"update_id": 1, "message": {**_BASE_MSG, **message_extras}}
+
+
+@pytest.fixture(scope="module")
+def relay() -> TelegramRelay:
+    """Shared relay for tests that only verify, extract or translate.
+
+    Tests that send or download build their own relay, since it caches its
+    HTTP client on first use and each test patches httpx.AsyncClient.
+    """
+    return TelegramRelay(bot_token=_BOT_TOKEN)
+
+
+@functools.cache
 def _make_secret_hash(bot_token: str) -> str:
     return hashlib.sha256(bot_token.encode()).hexdigest()
 
 
+def _resp(status_code: int = 200, json_data: Any = None) -> SimpleNamespace:
+    """Plain stand-in for an httpx.Response; the relay only reads these fields."""
+    return SimpleNamespace(
+        status_code=status_code,
+        raise_for_status=lambda: None,
+        json=lambda: json_data,
+    )
+
+
+def _make_stream(*chunks: bytes) -> MagicMock:
+    """Build a mock for ``client.stream(...)`` yielding the given body chunks."""
+
+    async def aiter_bytes(chunk_size: int | None = None) -> Any:
+        for chunk in chunks:
+            yield chunk
+
+    stream_response = SimpleNamespace(raise_for_status=lambda: None, aiter_bytes=aiter_bytes)
+    stream_cm = MagicMock()
+    stream_cm.__aenter__ = AsyncMock(return_value=stream_response)
+    stream_cm.__aexit__ = AsyncMock(return_value=False)
+    return MagicMock(return_value=stream_cm)
+
+
+ClientFactory = Callable[..., AsyncMock]
+
+
+@pytest.fixture
+def mock_httpx_client(monkeypatch: pytest.MonkeyPatch) -> ClientFactory:
+    """Factory that patches httpx.AsyncClient to hand out one mock client.
+
+    ``post`` may be a single response or a list (consumed in order);
+    ``stream_chunks`` configures ``client.stream``. The patched class is
+    exposed as ``client.client_cls`` for constructor assertions.
+    """
+
+    def _make(
+        *,
+        get: Any = None,
+        post: Any = None,
+        stream_chunks: list[bytes] | None = None,
+    ) -> AsyncMock:
+        client = AsyncMock()
+        if get is not None:
+            client.get.return_value = get
+        if isinstance(post, list):
+            client.post.side_effect = post
+        elif post is not None:
+            client.post.return_value = post
+        if stream_chunks is not None:
+            client.stream = _make_stream(*stream_chunks)
+        client.client_cls = MagicMock(return_value=client)
+        monkeypatch.setattr("src.webhook.telegram.httpx.AsyncClient", client.client_cls)
+        return client
+
+    return _make
+
+
 class TestTelegramWebhookVerification:
     """FR-2.4, FR-2.6: Webhook signature verification."""
 
-    def test_valid_secret_token_accepted(self) -> None:
-        bot_token = "123:ABC"
-        relay = TelegramRelay(bot_token=bot_token)
-        secret_hash = _make_secret_hash(bot_token)
+    def test_valid_secret_token_accepted(self, relay: TelegramRelay) -> None:
+        secret_hash = _make_secret_hash(_BOT_TOKEN)
         headers = {"x-telegram-bot-api-secret-token": secret_hash}
         assert relay.verify_webhook(headers) is True
 
-    def test_missing_secret_token_rejected(self) -> None:
-        relay = TelegramRelay(bot_token="123:ABC")
+    def test_missing_secret_token_rejected(self, relay: TelegramRelay) -> None:
         assert relay.verify_webhook({}) is False
 
-    def test_invalid_secret_token_rejected(self) -> None:
-        relay = TelegramRelay(bot_token="123:ABC")
+    def test_invalid_secret_token_rejected(self, relay: TelegramRelay) -> None:
         headers = {"x-telegram-bot-api-secret-token": "wrong_token"}
         assert relay.verify_webhook(headers) is False
 
-    def test_verification_uses_constant_time_comparison(self) -> None:
+    def test_verification_uses_constant_time_comparison(self, relay: TelegramRelay) -> None:
         """NFR-3: Constant-time comparison for token verification."""
-        relay = TelegramRelay(bot_token="123:ABC")
         with patch("src.webhook.telegram.hmac.compare_digest", return_value=True) as mock_cmp:
             headers = {"x-telegram-bot-api-secret-token": "anything"}
             relay.verify_webhook(headers)
             mock_cmp.assert_called_once()
 
-    def test_empty_secret_token_rejected(self) -> None:
-        relay = TelegramRelay(bot_token="123:ABC")
+    def test_empty_secret_token_rejected(self, relay: TelegramRelay) -> None:
         headers = {"x-telegram-bot-api-secret-token": ""}
         assert relay.verify_webhook(headers) is False
 
+    def test_non_ascii_secret_token_rejected(self, relay: TelegramRelay) -> None:
+        """Comparison runs on bytes, so non-ASCII input is rejected, not a TypeError."""
+        secret_hash = _make_secret_hash(_BOT_TOKEN)
+        headers = {"x-telegram-bot-api-secret-token": secret_hash[:-1] + "é"}
+        assert relay.verify_webhook(headers) is False
+
+    def test_constant_time_comparison_receives_bytes(self, relay: TelegramRelay) -> None:
+        with patch("src.webhook.telegram.hmac.compare_digest", return_value=False) as mock_cmp:
+            relay.verify_webhook({"x-telegram-bot-api-secret-token": "anything"})
+        given, expected = mock_cmp.call_args[0]
+        assert isinstance(given, bytes)
+        assert isinstance(expected, bytes)
+
 
 class TestTelegramMessageExtraction:
     """FR-2.1: Extract and translate Telegram messages."""
 
-    def test_extracts_text_message(self) -> None:
-        relay = TelegramRelay(bot_token="test")
+    def test_extracts_text_message(self, relay: TelegramRelay) -> None:
         update = {
             "update_id": 123,
             "message": {
@@ -65,8 +154,7 @@ class TestTelegramMessageExtraction:
         assert extraction.text == "hello world"
         assert extraction.chat_id == 456
 
-    def test_extracts_update_id(self) -> None:
-        relay = TelegramRelay(bot_token="test")
+    def test_extracts_update_id(self, relay: TelegramRelay) -> None:
         update = {
             "update_id": 999,
             "message": {"chat": {"id": 1}, "text": "hi"},
@@ -74,17 +162,11 @@ class TestTelegramMessageExtraction:
         extraction = relay.extract_message(update)
         assert extraction.update_id == 999
 
-    def test_handles_missing_text(self) -> None:
-        relay = TelegramRelay(bot_token="test")
-        update = {
-            "update_id": 123,
-            "message": {"chat": {"id": 1}},
-        }
-        extraction = relay.extract_message(update)
+    def test_handles_missing_text(self, relay: TelegramRelay) -> None:
+        extraction = relay.extract_message(_upd())
         assert extraction.text == ""
 
-    def test_handles_edited_message(self) -> None:
-        relay = TelegramRelay(bot_token="test")
+    def test_handles_edited_message(self, relay: TelegramRelay) -> None:
         update = {
             "update_id": 123,
             "edited_message": {
@@ -96,8 +178,7 @@ class TestTelegramMessageExtraction:
         assert extraction.text == "edited text"
         assert extraction.chat_id == 789
 
-    def test_no_message_returns_empty(self) -> None:
-        relay = TelegramRelay(bot_token="test")
+    def test_no_message_returns_empty(self, relay: TelegramRelay) -> None:
         update = {"update_id": 123}
         extraction = relay.extract_message(update)
         assert extraction.update_id == 123
@@ -108,223 +189,178 @@ class TestTelegramMessageExtraction:
 class TestTelegramFileExtraction:
     """Extraction of file metadata from Telegram message types."""
 
-    def test_photo_picks_largest_resolution(self) -> None:
+    def test_photo_picks_largest_resolution(self, relay: TelegramRelay) -> None:
         """Telegram sends multiple photo sizes; we pick the last (largest)."""
-        relay = TelegramRelay(bot_token="test")
-        update = {
-            "update_id": 1,
-            "message": {
-                "chat": {"id": 1},
-                "photo": [
-                    {"file_id": "small", "file_size": 1000, "width": 90, "height": 90},
-                    {"file_id": "medium", "file_size": 5000, "width": 320, "height": 240},
-                    {"file_id": "large", "file_size": 20000, "width": 1280, "height": 960},
-                ],
-            },
-        }
-        extraction = relay.extract_message(update)
+        extraction = relay.extract_message(_upd(photo=[
+            {"file_id": "small", "file_size": 1000, "width": 90, "height": 90},
+            {"file_id": "medium", "file_size": 5000, "width": 320, "height": 240},
+            {"file_id": "large", "file_size": 20000, "width": 1280, "height": 960},
+        ]))
         assert len(extraction.file_infos) == 1
         assert extraction.file_infos[0].file_id == "large"
         assert extraction.file_infos[0].file_type == AttachmentType.IMAGE
 
-    def test_document_extraction(self) -> None:
-        relay = TelegramRelay(bot_token="test")
-        update = {
-            "update_id": 1,
-            "message": {
-                "chat": {"id": 1},
-                "document": {
+    @pytest.mark.parametrize(
+        ("msg_key", "payload", "expected_type", "expected_mime", "expected_name"),
+        [
+            pytest.param(
+                "document",
+                {
                     "file_id": "doc_abc",
                     "file_name": "report.pdf",
                     "mime_type": "application/pdf",
                     "file_size": 50000,
                 },
-            },
-        }
-        extraction = relay.extract_message(update)
-        assert len(extraction.file_infos) == 1
-        info = extraction.file_infos[0]
-        assert info.file_id == "doc_abc"
-        assert info.file_type == AttachmentType.DOCUMENT
-        assert info.mime_type == "application/pdf"
-        assert info.file_name == "report.pdf"
-
-    def test_audio_extraction(self) -> None:
-        relay = TelegramRelay(bot_token="test")
-        update = {
-            "update_id": 1,
-            "message": {
-                "chat": {"id": 1},
-                "audio": {
+                AttachmentType.DOCUMENT, "application/pdf", "report.pdf",
+                id="document",
+            ),
+            pytest.param(
+                "audio",
+                {
                     "file_id": "audio_xyz",
                     "file_name": "song.mp3",
                     "mime_type": "audio/mpeg",
                     "file_size": 3000000,
                 },
-            },
-        }
-        extraction = relay.extract_message(update)
-        assert len(extraction.file_infos) == 1
-        assert extraction.file_infos[0].file_type == AttachmentType.AUDIO
-
-    def test_voice_extraction(self) -> None:
-        relay = TelegramRelay(bot_token="test")
-        update = {
-            "update_id": 1,
-            "message": {
-                "chat": {"id": 1},
-                "voice": {
-                    "file_id": "voice_123",
-                    "mime_type": "audio/ogg",
-                    "file_size": 50000,
-                },
-            },
-        }
-        extraction = relay.extract_message(update)
-        assert len(extraction.file_infos) == 1
-        info = extraction.file_infos[0]
-        assert info.file_type == AttachmentType.VOICE
-        assert info.file_name == "voice.ogg"
-
-    def test_video_extraction(self) -> None:
-        relay = TelegramRelay(bot_token="test")
-        update = {
-            "update_id": 1,
-            "message": {
-                "chat": {"id": 1},
-                "video": {
-                    "file_id": "vid_456",
-                    "mime_type": "video/mp4",
-                    "file_size": 5000000,
-                },
-            },
-        }
-        extraction = relay.extract_message(update)
-        assert len(extraction.file_infos) == 1
-        assert extraction.file_infos[0].file_type == AttachmentType.VIDEO
-
-    def test_sticker_extraction(self) -> None:
-        relay = TelegramRelay(bot_token="test")
-        update = {
-            "update_id": 1,
-            "message": {
-                "chat": {"id": 1},
-                "sticker": {
-                    "file_id": "sticker_789",
-                    "file_size": 10000,
-                },
-            },
-        }
-        extraction = relay.extract_message(update)
+                AttachmentType.AUDIO, "audio/mpeg", "song.mp3",
+                id="audio",
+            ),
+            pytest.param(
+                "voice",
+                {"file_id": "voice_123", "mime_type": "audio/ogg", "file_size": 50000},
+                AttachmentType.VOICE, "audio/ogg", "voice.ogg",
+                id="voice",
+            ),
+            pytest.param(
+                "video",
+                {"file_id": "vid_456", "mime_type": "video/mp4", "file_size": 5000000},
+                AttachmentType.VIDEO, "video/mp4", "video.mp4",
+                id="video",
+            ),
+            pytest.param(
+                "sticker",
+                {"file_id": "sticker_789", "file_size": 10000},
+                AttachmentType.STICKER, "image/webp", "sticker.webp",
+                id="sticker",
+            ),
+        ],
+    )
+    def test_single_file_extraction(
+        self,
+        relay: TelegramRelay,
+        msg_key: str,
+        payload: dict[str, Any],
+        expected_type: AttachmentType,
+        expected_mime: str,
+        expected_name: str,
+    ) -> None:
+        extraction = relay.extract_message(_upd(**{msg_key: payload}))
         assert len(extraction.file_infos) == 1
         info = extraction.file_infos[0]
-        assert info.file_type == AttachmentType.STICKER
-        assert info.mime_type == "image/webp"
+        assert info.file_id == payload["file_id"]
+        assert info.file_type == expected_type
+        assert info.mime_type == expected_mime
+        assert info.file_name == expected_name
 
-    def test_caption_used_as_text(self) -> None:
+    def test_caption_used_as_text(self, relay: TelegramRelay) -> None:
         """Message captions (accompanying files) are treated as text."""
-        relay = TelegramRelay(bot_token="test")
-        update = {
-            "update_id": 1,
-            "message": {
-                "chat": {"id": 1},
-                "photo": [{"file_id": "p1", "file_size": 5000}],
-                "caption": "Here is the receipt",
-            },
-        }
-        extraction = relay.extract_message(update)
+        extraction = relay.extract_message(_upd(
+            photo=[{"file_id": "p1", "file_size": 5000}],
+            caption="Here is the receipt",
+        ))
         assert extraction.text == "Here is the receipt"
         assert len(extraction.file_infos) == 1
 
-    def test_no_file_returns_empty_list(self) -> None:
-        relay = TelegramRelay(bot_token="test")
-        update = {
-            "update_id": 1,
-            "message": {"chat": {"id": 1}, "text": "plain text only"},
-        }
-        extraction = relay.extract_message(update)
+    def test_no_file_returns_empty_list(self, relay: TelegramRelay) -> None:
+        extraction = relay.extract_message(_upd(text="plain text only"))
         assert extraction.file_infos == []
 
 
 class TestTelegramFileDownload:
     """File download logic: getFile → download bytes, size enforcement."""
 
-    @pytest.mark.asyncio
-    async def test_successful_download(self) -> None:
+    async def test_successful_download(self, mock_httpx_client: ClientFactory) -> None:
         """Two-step download: getFile → CDN fetch."""
         relay = TelegramRelay(bot_token="bot123")
         file_content = b"PDF content here"
 
-        get_file_response = MagicMock()
-        get_file_response.raise_for_status = MagicMock()
-        get_file_response.json.return_value = {
+        get_file_response = _resp(json_data={
             "ok": True,
             "result": {"file_path": "documents/file_42.pdf", "file_size": 16},
-        }
-
-        download_response = MagicMock()
-        download_response.raise_for_status = MagicMock()
-        download_response.content = file_content
-
-        mock_client = AsyncMock()
-        mock_client.get.side_effect = [get_file_response, download_response]
-        mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-        mock_client.__aexit__ = AsyncMock(return_value=False)
+        })
+        mock_client = mock_httpx_client(
+            get=get_file_response, stream_chunks=[file_content[:6], file_content[6:]],
+        )
 
-        with patch("src.webhook.telegram.httpx.AsyncClient", return_value=mock_client):
-            result = await relay.download_file("file_id_42")
+        result = await relay.download_file("file_id_42")
 
         assert result == file_content
-        assert mock_client.get.call_count == 2
+        assert result.readonly
         # First call: getFile endpoint
-        first_url = mock_client.get.call_args_list[0][0][0]
+        first_url = mock_client.get.call_args[0][0]
         assert "getFile" in first_url
         assert "file_id_42" in first_url
-        # Second call: CDN download
-        second_url = mock_client.get.call_args_list[1][0][0]
+        # Second call: streamed CDN download
+        method, second_url = mock_client.stream.call_args[0]
+        assert method == "GET"
         assert "documents/file_42.pdf" in second_url
 
-    @pytest.mark.asyncio
-    async def test_file_too_large_raises(self) -> None:
+    async def test_download_without_reported_size(
+        self, mock_httpx_client: ClientFactory,
+    ) -> None:
+        """A missing file_size in getFile still yields the full body."""
+        relay = TelegramRelay(bot_token="bot123")
+
+        get_file_response = _resp(json_data={
+            "ok": True,
+            "result": {"file_path": "photos/file_1.jpg"},
+        })
+        mock_httpx_client(get=get_file_response, stream_chunks=[b"jpeg ", b"bytes"])
+
+        result = await relay.download_file("file_id_1")
+
+        assert result == b"jpeg bytes"
+
+    async def test_oversized_stream_aborts_download(
+        self, mock_httpx_client: ClientFactory,
+    ) -> None:
+        """Bodies larger than the cap are rejected even if getFile under-reports."""
+        relay = TelegramRelay(bot_token="bot123")
+
+        get_file_response = _resp(json_data={
+            "ok": True,
+            "result": {"file_path": "documents/big.pdf", "file_size": 4},
+        })
+        mock_httpx_client(get=get_file_response, stream_chunks=[b"1234", b"5678"])
+
+        with patch("src.webhook.telegram._MAX_FILE_SIZE", 6):
+            with pytest.raises(ValueError, match="Downloaded file too large"):
+                await relay.download_file("big_id")
+
+    async def test_file_too_large_raises(self, mock_httpx_client: ClientFactory) -> None:
         """Files exceeding 20MB are rejected before download."""
         relay = TelegramRelay(bot_token="bot123")
         large_size = 21 * 1024 * 1024  # 21MB
 
-        get_file_response = MagicMock()
-        get_file_response.raise_for_status = MagicMock()
-        get_file_response.json.return_value = {
+        get_file_response = _resp(json_data={
             "ok": True,
             "result": {"file_path": "big/file.mp4", "file_size": large_size},
-        }
+        })
+        mock_httpx_client(get=get_file_response)
 
-        mock_client = AsyncMock()
-        mock_client.get.return_value = get_file_response
-        mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-        mock_client.__aexit__ = AsyncMock(return_value=False)
+        with pytest.raises(ValueError, match="File too large"):
+            await relay.download_file("big_file_id")
 
-        with patch("src.webhook.telegram.httpx.AsyncClient", return_value=mock_client):
-            with pytest.raises(ValueError, match="File too large"):
-                await relay.download_file("big_file_id")
-
-    @pytest.mark.asyncio
-    async def test_api_error_raises(self) -> None:
+    async def test_api_error_raises(self, mock_httpx_client: ClientFactory) -> None:
         """Non-ok Telegram API response raises ValueError."""
         relay = TelegramRelay(bot_token="bot123")
 
-        error_response = MagicMock()
-        error_response.raise_for_status = MagicMock()
-        error_response.json.return_value = {"ok": False, "description": "file not found"}
-
-        mock_client = AsyncMock()
-        mock_client.get.return_value = error_response
-        mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-        mock_client.__aexit__ = AsyncMock(return_value=False)
+        error_response = _resp(json_data={"ok": False, "description": "file not found"})
+        mock_httpx_client(get=error_response)
 
-        with patch("src.webhook.telegram.httpx.AsyncClient", return_value=mock_client):
-            with pytest.raises(ValueError, match="not-ok"):
-                await relay.download_file("bad_file_id")
+        with pytest.raises(ValueError, match="not-ok"):
+            await relay.download_file("bad_file_id")
 
-    @pytest.mark.asyncio
     async def test_build_attachments_skips_failures(self) -> None:
         """A download failure for one file does not prevent others from succeeding."""
         relay = TelegramRelay(bot_token="bot123")
@@ -351,8 +387,6 @@ class TestTelegramFileDownload:
                 return b"image bytes"
             raise httpx.ConnectError("network failure")
 
-        import httpx
-
         with patch.object(relay, "download_file", side_effect=mock_download):
             attachments = await relay.build_attachments(file_infos)
 
@@ -361,20 +395,48 @@ class TestTelegramFileDownload:
         assert attachments[0].file_id == "good_id"
         assert attachments[0].data == b"image bytes"
 
+    async def test_build_attachments_downloads_concurrently(self) -> None:
+        """Downloads for one message overlap and results keep message order."""
+        relay = TelegramRelay(bot_token="bot123")
+        file_infos = [
+            TelegramFileInfo(
+                file_id=f"id_{i}",
+                file_type=AttachmentType.DOCUMENT,
+                mime_type="application/pdf",
+                file_name=f"doc{i}.pdf",
+                file_size=10,
+            )
+            for i in range(3)
+        ]
+        in_flight = 0
+        max_in_flight = 0
+
+        async def mock_download(file_id: str) -> bytes:
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            return file_id.encode()
+
+        with patch.object(relay, "download_file", side_effect=mock_download):
+            attachments = await relay.build_attachments(file_infos)
+
+        assert max_in_flight == 3
+        assert [a.file_id for a in attachments] == ["id_0", "id_1", "id_2"]
+
 
 class TestTelegramProtocolTranslation:
     """FR-2.1: Translate to OpenAI-compatible format."""
 
-    def test_to_openclaw_request_format(self) -> None:
-        relay = TelegramRelay(bot_token="test")
+    def test_to_openclaw_request_format(self, relay: TelegramRelay) -> None:
         result = relay.to_openclaw_request("hello", chat_id=12345)
         assert result["messages"][0]["role"] == "user"
         assert result["messages"][0]["content"] == "hello"
         assert result["metadata"]["source"] == "telegram"
         assert result["metadata"]["chat_id"] == 12345
 
-    def test_model_is_default(self) -> None:
-        relay = TelegramRelay(bot_token="test")
+    def test_model_is_default(self, relay: TelegramRelay) -> None:
         result = relay.to_openclaw_request("test", chat_id=1)
         assert result["model"] == "default"
 
@@ -382,122 +444,96 @@ class TestTelegramProtocolTranslation:
 class TestTelegramResponseSending:
     """FR-2.3, FR-2.5, FR-2.8: Send response back via Telegram API."""
 
-    @pytest.mark.asyncio
-    async def test_sends_response_with_tls_verification(self) -> None:
+    async def test_sends_response_with_tls_verification(
+        self, mock_httpx_client: ClientFactory,
+    ) -> None:
         """NFR-9: TLS certificate verification enabled."""
         relay = TelegramRelay(bot_token="123:ABC")
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-
-        with patch("src.webhook.telegram.httpx.AsyncClient") as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client.post.return_value = mock_response
-            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-            mock_client.__aexit__ = AsyncMock(return_value=False)
-            mock_client_cls.return_value = mock_client
-
-            await relay.send_response(chat_id=12345, text="reply text")
-
-            mock_client_cls.assert_called_once_with(verify=True)
-            mock_client.post.assert_called_once()
-            call_kwargs = mock_client.post.call_args
-            assert "api.telegram.org" in call_kwargs[0][0]
-            assert call_kwargs[1]["json"]["chat_id"] == 12345
-            assert call_kwargs[1]["json"]["text"] == "reply text"
-
-    @pytest.mark.asyncio
-    async def test_retries_on_429(self) -> None:
-        """FR-2.8: Retry on rate limit."""
+        mock_client = mock_httpx_client(post=_resp(200))
+
+        await relay.send_response(chat_id=12345, text="reply text")
+
+        mock_client.client_cls.assert_called_once()
+        assert mock_client.client_cls.call_args[1]["verify"] is True
+        mock_client.post.assert_called_once()
+        call_kwargs = mock_client.post.call_args
+        assert "api.telegram.org" in call_kwargs[0][0]
+        assert call_kwargs[1]["json"]["chat_id"] == 12345
+        assert call_kwargs[1]["json"]["text"] == "reply text"
+
+    async def test_client_reused_across_calls(self, mock_httpx_client: ClientFactory) -> None:
+        """One pooled client serves every Telegram API call until aclose()."""
         relay = TelegramRelay(bot_token="123:ABC")
-        mock_429 = MagicMock(status_code=429)
-        mock_200 = MagicMock(status_code=200)
+        mock_client = mock_httpx_client(post=_resp(200))
+
+        await relay.send_response(chat_id=1, text="one")
+        await relay.send_response(chat_id=1, text="two")
+        await relay.aclose()
 
-        with patch("src.webhook.telegram.httpx.AsyncClient") as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client.post.side_effect = [mock_429, mock_200]
-            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-            mock_client.__aexit__ = AsyncMock(return_value=False)
-            mock_client_cls.return_value = mock_client
+        mock_client.client_cls.assert_called_once()
+        assert mock_client.post.call_count == 2
+        mock_client.aclose.assert_awaited_once()
 
-            with patch("src.webhook.telegram.asyncio.sleep", new_callable=AsyncMock):
-                await relay.send_response(chat_id=1, text="hi")
+    async def test_retries_on_429(self, mock_httpx_client: ClientFactory) -> None:
+        """FR-2.8: Retry on rate limit."""
+        relay = TelegramRelay(bot_token="123:ABC")
+        mock_429 = _resp(429)
+        mock_200 = _resp(200)
+        mock_client = mock_httpx_client(post=[mock_429, mock_200])
+
+        with patch("src.webhook.telegram.asyncio.sleep", new_callable=AsyncMock):
+            await relay.send_response(chat_id=1, text="hi")
 
-            assert mock_client.post.call_count == 2
+        assert mock_client.post.call_count == 2
 
-    @pytest.mark.asyncio
-    async def test_retries_on_5xx(self) -> None:
+    async def test_retries_on_5xx(self, mock_httpx_client: ClientFactory) -> None:
         """FR-2.8: Retry on server error."""
         relay = TelegramRelay(bot_token="123:ABC")
-        mock_500 = MagicMock(status_code=500)
-        mock_200 = MagicMock(status_code=200)
+        mock_500 = _resp(500)
+        mock_200 = _resp(200)
+        mock_client = mock_httpx_client(post=[mock_500, mock_200])
 
-        with patch("src.webhook.telegram.httpx.AsyncClient") as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client.post.side_effect = [mock_500, mock_200]
-            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-            mock_client.__aexit__ = AsyncMock(return_value=False)
-            mock_client_cls.return_value = mock_client
-
-            with patch("src.webhook.telegram.asyncio.sleep", new_callable=AsyncMock):
-                await relay.send_response(chat_id=1, text="hi")
+        with patch("src.webhook.telegram.asyncio.sleep", new_callable=AsyncMock):
+            await relay.send_response(chat_id=1, text="hi")
 
-            assert mock_client.post.call_count == 2
+        assert mock_client.post.call_count == 2
 
-    @pytest.mark.asyncio
-    async def test_no_retry_on_4xx(self) -> None:
+    async def test_no_retry_on_4xx(self, mock_httpx_client: ClientFactory) -> None:
         """FR-2.8: No retry on client errors (except 429)."""
         relay = TelegramRelay(bot_token="123:ABC")
-        mock_400 = MagicMock(status_code=400)
+        mock_400 = _resp(400)
+        mock_client = mock_httpx_client(post=mock_400)
 
-        with patch("src.webhook.telegram.httpx.AsyncClient") as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client.post.return_value = mock_400
-            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-            mock_client.__aexit__ = AsyncMock(return_value=False)
-            mock_client_cls.return_value = mock_client
-
-            await relay.send_response(chat_id=1, text="hi")
+        await relay.send_response(chat_id=1, text="hi")
 
-            assert mock_client.post.call_count == 1
+        assert mock_client.post.call_count == 1
 
-    @pytest.mark.asyncio
-    async def test_max_3_retries(self) -> None:
+    async def test_max_3_retries(self, mock_httpx_client: ClientFactory) -> None:
         """FR-2.5: Max 3 retries."""
         relay = TelegramRelay(bot_token="123:ABC")
-        mock_500 = MagicMock(status_code=500)
+        mock_500 = _resp(500)
+        mock_client = mock_httpx_client(post=mock_500)
 
-        with patch("src.webhook.telegram.httpx.AsyncClient") as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client.post.return_value = mock_500
-            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-            mock_client.__aexit__ = AsyncMock(return_value=False)
-            mock_client_cls.return_value = mock_client
-
-            with patch("src.webhook.telegram.asyncio.sleep", new_callable=AsyncMock):
-                await relay.send_response(chat_id=1, text="hi")
+        with patch("src.webhook.telegram.asyncio.sleep", new_callable=AsyncMock):
+            await relay.send_response(chat_id=1, text="hi")
 
-            # 1 initial + 3 retries = 4 total
-            assert mock_client.post.call_count == 4
+        # 1 initial + 3 retries = 4 total
+        assert mock_client.post.call_count == 4
 
-    @pytest.mark.asyncio
-    async def test_backoff_capped_at_30_seconds(self) -> None:
+    async def test_backoff_capped_at_30_seconds(self, mock_httpx_client: ClientFactory) -> None:
         """FR-2.8: Backoff capped at 30s."""
         relay = TelegramRelay(bot_token="123:ABC")
-        mock_500 = MagicMock(status_code=500)
+        mock_500 = _resp(500)
+        mock_httpx_client(post=mock_500)
 
         sleep_times: list[float] = []
 
         async def capture_sleep(t: float) -> None:
             sleep_times.append(t)
 
-        with patch("src.webhook.telegram.httpx.AsyncClient") as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client.post.return_value = mock_500
-            mock_client.__aenter__ = AsyncMock(return_value=mock_client)
-            mock_client.__aexit__ = AsyncMock(return_value=False)
-            mock_client_cls.return_value = mock_client
-
-            with patch("src.webhook.telegram.asyncio.sleep", side_effect=capture_sleep):
-                await relay.send_response(chat_id=1, text="hi")
+        with patch("src.webhook.telegram.asyncio.sleep", side_effect=capture_sleep):
+            await relay.send_response(chat_id=1, text="hi")
 
-            assert all(t <= 30 for t in sleep_times)
+        assert all(t <= 30 for t in sleep_times)
+        # No sleep after the final attempt
+        assert sleep_times == [1, 2, 4]